@@ -2,33 +2,61 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import sys
 import json
+import hashlib
+import functools
+import click
 import dateutil.parser
-from datetime import datetime
+from datetime import datetime, timedelta
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Blueprint, Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, current_app, make_response
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from jinja2 import FileSystemBytecodeCache
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import FlaskForm
 from forms import *
+from models import *
+import pooling
+import replicas
+import search
+import geo
+import counters
+import partitions
+from booking import boundary_conflict, booking_conflict, find_conflicts
+from facets import (
+    facet_counts, facet_filters, facet_links, filter_by_facets, has_genres)
+from listings import ArtistRow, ShowRow, VenueRow, listing_query
+from pagination import KeysetPage, is_streamed, page_limit, stream_template
+from cache import (
+    FragmentCache, ViewCache, fragment_key, venue_key, artist_key,
+    facets_key, calendar_key)
+from metrics import Metrics
+from replicas import ReplicaRouter, read_only
+from concurrency import QueryTimeout, fetch_all
+from assets import Assets, assets_command
+import seed
+import importer
+import exporter
 
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Extensions.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-
-from models import *
+moment = Moment()
+migrate = Migrate()
+view_cache = ViewCache()
+fragment_cache = FragmentCache()
+metrics = Metrics()
+replica_router = ReplicaRouter()
+assets = Assets()
 
-migrate = Migrate(app, db)
+main = Blueprint('main', __name__)
 
 
 #----------------------------------------------------------------------------#
@@ -36,16 +64,126 @@ migrate = Migrate(app, db)
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _datetime_pattern(format, locale):
+    # Compiled Babel pattern and parsed locale per (format, locale)
+    return babel.dates.parse_pattern(format), babel.Locale.parse(locale)
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+    pattern, locale = _datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    # Accepts datetime objects as is, strings are parsed for compatibility
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    format = DATETIME_FORMATS.get(format, format)
+    return _format_datetime(value, format, locale)
+
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+
+def cache_enabled():
+    # ?nocache=1 bypasses the view cache for debugging
+    return request.args.get('nocache') != '1'
+
+
+def venue_artist_keys(venue_id):
+    # Keys of the artist pages listing the venue's name and image in their
+    # shows, to invalidate along with the venue's own page
+    return [artist_key(artist_id) for artist_id, in db.session.query(
+        Show.artist_id).filter(Show.venue_id==venue_id).distinct()]
+
+
+def artist_venue_keys(artist_id):
+    # Keys of the venue pages listing the artist's name and image
+    return [venue_key(venue_id) for venue_id, in db.session.query(
+        Show.venue_id).filter(Show.artist_id==artist_id).distinct()]
+
+
+@main.route('/cache/stats')
+def cache_stats():
+    return jsonify(dict(
+        view_cache.stats(), fragments=fragment_cache.stats()))
+
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+
+@main.route('/metrics')
+def prometheus_metrics():
+    # Per endpoint SQL and latency histograms in Prometheus text format
+    stats = view_cache.stats()
+    extra = [
+        ('fyyur_view_cache_hits_total', 'counter',
+            'View cache hits.', stats['hits']),
+        ('fyyur_view_cache_misses_total', 'counter',
+            'View cache misses.', stats['misses']),
+    ]
+    stats = fragment_cache.stats()
+    extra += [
+        ('fyyur_fragment_cache_hits_total', 'counter',
+            'Template fragments served from the cache.', stats['hits']),
+        ('fyyur_fragment_cache_misses_total', 'counter',
+            'Template fragments rendered.', stats['misses']),
+        ('fyyur_fragment_cache_render_seconds_total', 'counter',
+            'Time spent rendering cacheable fragments.',
+            stats['render_seconds']),
+        ('fyyur_fragment_cache_saved_seconds_total', 'counter',
+            'Render time saved by fragment cache hits.',
+            stats['saved_seconds']),
+    ]
+    extra += replica_router.metrics()
+    extra += pooling.metrics(replicas.engines())
+    return Response(
+        metrics.render(extra),
+        mimetype='text/plain; version=0.0.4')
+
+
+#----------------------------------------------------------------------------#
+# Show counts.
+#----------------------------------------------------------------------------#
+
+# Ids per IN (...) list, keeps statements small for long result lists
+SHOW_COUNTS_BATCH_SIZE = 1000
+
 
+def show_counts(model, ids):
+    # {id: (upcoming, past)} for Venue or Artist ids, read from the
+    # counters kept by counters.py with one lookup per batch of ids
+    ids = list(dict.fromkeys(ids))
+    counts = {}
+    for start in range(0, len(ids), SHOW_COUNTS_BATCH_SIZE):
+        batch = ids[start:start + SHOW_COUNTS_BATCH_SIZE]
+        counts.update(
+            (row[0], row[1:]) for row in db.session.query(
+                model.id, model.upcoming_show_count,
+                model.past_show_count).filter(model.id.in_(batch)))
+    return counts
 
-app.jinja_env.filters['datetime'] = format_datetime
+
+def attach_show_counts(rows, model):
+    # Sets num_upcoming_shows and num_past_shows on row dicts keyed by
+    # 'id', with a single batched lookup for the whole list
+    counts = show_counts(model, [row['id'] for row in rows])
+    for row in rows:
+        row['num_upcoming_shows'], row['num_past_shows'] = counts.get(
+            row['id'], (0, 0))
+    return rows
 
 
 #----------------------------------------------------------------------------#
@@ -53,7 +191,7 @@ app.jinja_env.filters['datetime'] = format_datetime
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -61,97 +199,159 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+def facet_sidebar(model, genres, state):
+    # Genre and state facets of a listing, counts are cached briefly
+    counts = view_cache.get_or_set(
+        facets_key(model.__tablename__, state, *sorted(genres)),
+        lambda: facet_counts(model, genres, state),
+        enabled=cache_enabled(),
+        ttl=current_app.config['FACET_CACHE_TTL'])
+    return facet_links(counts, genres, state)
+
+
+def venue_listing(genres, state):
+    # Columns of VenueRow for every venue matching the facets, per area
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.version,
+        Venue.upcoming_show_count)
+    return filter_by_facets(query, Venue, genres, state).order_by(
+        Venue.city, Venue.state)
+
+
+@main.route('/venues')
 def venues():
-    # Shows all venues per area
+    # Shows all venues per area, optionally narrowed with ?genre=&state=
     # Queries
-    all_venues = db.session.query(Venue).order_by(
-        Venue.city, Venue.state).all()
+    genres, state = facet_filters()
+    all_venues = listing_query(venue_listing(genres, state)).all()
+    facets = facet_sidebar(Venue, genres, state)
 
     # Variables
     data = []
-    area = ''
+    area = None
 
     # Formating data
-    for venue in all_venues:
-        num_upcoming_shows = len(db.session.query(Show).filter(
-            Show.venue_id==venue.id).filter(
-            Show.show_time>datetime.now()).all())
-
-        if area == venue.city + venue.state:
-            data[len(data) - 1]['venues'].append({
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': num_upcoming_shows
-            })
-        else:
+    for row in all_venues:
+        venue = VenueRow(*row)
+        if area != (venue.city, venue.state):
             data.append({
                 'city': venue.city,
                 'state': venue.state,
-                'venues': [{
-                    'id': venue.id,
-                    'name': venue.name,
-                    'num_upcoming_shows': num_upcoming_shows
-                }]
+                'venues': []
             })
-            area = venue.city + venue.state
-    return render_template('pages/venues.html', areas=data)
+            area = (venue.city, venue.state)
+        data[-1]['venues'].append(venue)
+    return render_template('pages/venues.html', areas=data, facets=facets)
 
 
 # Search a venue
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     # Searches for a venue by a given search term
     # Queries
-    search_query = db.session.query(Venue).filter(
-        Venue.name.ilike(f'%{search_term}%')).all()
-
     search_term = request.form.get('search_term', '')
-
-    upcoming_shows = db.session.query(Show).filter(
-        Show.venue_id==1).filter(Show.show_time>datetime.now()).all()
-
-    # Variables
-    data = []
-    response = {}
+    response = search.search(Venue, search_term)
 
     # Formating data
-    for _row in search_query:
-        venue_shows = db.session.query(Show).filter_by(
-            venue_id=_row.id).all()
-        data.append({
-            'id': _row.id,
-            'name': _row.name,
-            'num_upcomming_shows': len(upcoming_shows)
-        })
+    attach_show_counts(response['data'], Venue)
 
-    response = {
-        'count': len(search_query),
-        'data': data
-    }
     return render_template(
         'pages/search_venues.html',
         results=response,
-        search_term=request.form.get('search_term', ''))
-
+        search_term=search_term)
+
+
+@main.route('/venues/nearby')
+def nearby_venues():
+    # Nearest venues to a point as JSON, with their upcoming show counts:
+    # /venues/nearby?lat=&lng=&limit=&radius=<km>
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    radius = request.args.get('radius', type=float)
+    limit = request.args.get(
+        'limit', current_app.config['NEARBY_DEFAULT_LIMIT'], type=int)
+    if latitude is None or longitude is None or \
+            not -90 <= latitude <= 90 or not -180 <= longitude <= 180 or \
+            (radius is not None and radius <= 0):
+        abort(400)
+    limit = max(1, min(limit, current_app.config['NEARBY_MAX_LIMIT']))
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    # shows the artist page with the given venue_id
     # Queries
-    venue = db.session.query(Venue).filter_by(
-        id=venue_id).first()
-
-    venue_shows = db.session.query(Show).filter_by(
-        venue_id=venue_id).all()
+    nearest = geo.nearest(latitude, longitude, limit, radius)
+    venue_ids = [venue_id for venue_id, _ in nearest]
+    venues = {}
+    if venue_ids:
+        venues = {row.id: row for row in db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude,
+            Venue.longitude).filter(Venue.id.in_(venue_ids))}
 
-    past_shows_query = db.session.query(Show).join(Artist).filter(
-        Show.venue_id==venue_id).filter(
-        Show.show_time<=datetime.now()).all()
+    # Formating data
+    data = []
+    for venue_id, distance in nearest:
+        venue = venues.get(venue_id)
+        if venue is None:
+            continue
+        data.append({
+            'id': venue.id,
+            'name': venue.name,
+            'city': venue.city,
+            'state': venue.state,
+            'latitude': venue.latitude,
+            'longitude': venue.longitude,
+            'distance_km': round(distance, 3)
+        })
+    attach_show_counts(data, Venue)
+    return jsonify({'lat': latitude, 'lng': longitude, 'venues': data})
+
+
+def fetch_venue(venue_id, now):
+    # Venue and its (artist_id, show_time, artist name, artist image, show
+    # id, show version, artist version) rows from one joined statement
+    venue_shows = db.session.query(
+        Venue, Show.artist_id, Show.show_time,
+        Artist.name, Artist.image_link,
+        Show.id, Show.version, Artist.version).outerjoin(
+        Show, Show.venue_id==Venue.id).outerjoin(
+        Artist, Artist.id==Show.artist_id).filter(
+        Venue.id==venue_id).order_by(Show.show_time).all()
+
+    if not venue_shows:
+        return None, []
+    return venue_shows[0].Venue, [row[1:] for row in venue_shows]
+
+
+def fetch_venue_concurrently(venue_id, now):
+    # Same as fetch_venue, with the venue, past and upcoming shows fetched
+    # by three statements running at the same time
+    shows = db.session.query(
+        Show.artist_id, Show.show_time,
+        Artist.name, Artist.image_link,
+        Show.id, Show.version, Artist.version).join(
+        Artist, Artist.id==Show.artist_id).filter(
+        Show.venue_id==venue_id).order_by(Show.show_time)
+
+    venues, past_shows, upcoming_shows = fetch_all(
+        db.session.query(Venue).filter(Venue.id==venue_id).statement,
+        shows.filter(Show.show_time<=now).statement,
+        shows.filter(Show.show_time>now).statement)
+
+    if not venues:
+        return None, []
+    return venues[0], past_shows + upcoming_shows
+
+
+def venue_page(venue_id):
+    # Builds the venue page payload, None if the venue doesn't exist
+    # Queries
+    now = datetime.now()
+    if current_app.config['DETAIL_QUERY_MODE'] == 'concurrent':
+        venue, venue_shows = fetch_venue_concurrently(venue_id, now)
+    else:
+        venue, venue_shows = fetch_venue(venue_id, now)
 
-    upcoming_shows_query = db.session.query(Show).join(Artist).filter(
-        Show.venue_id==venue_id).filter(
-        Show.show_time>datetime.now()).all()
+    if venue is None:
+        return None
 
     # Variables
     past_shows = []
@@ -159,21 +359,23 @@ def show_venue(venue_id):
     data = {}
 
     # Formating data
-    for show in past_shows_query:
-        past_shows.append({
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.show_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.show_time.strftime("%Y-%m-%d %H:%M:%S")
-        })
+    for artist_id, show_time, artist_name, artist_image_link, show_id, \
+            show_version, artist_version in venue_shows:
+        if show_time is None:
+            continue
+
+        show = {
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": artist_image_link,
+            "start_time": show_time,
+            "fragment_key": fragment_key(
+                'venue-show', show_id, show_version, artist_version)
+        }
+        if show_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
 
     data = {
         "id": venue.id,
@@ -193,19 +395,33 @@ def show_venue(venue_id):
         "past_shows_count": len(past_shows),
         "upcoming_shows_count": len(upcoming_shows)
     }
+    return data
+
+
+@main.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    data = view_cache.get_or_set(
+        venue_key(venue_id), lambda: venue_page(venue_id),
+        enabled=cache_enabled())
+
+    # Redirect to error page if nothing found
+    if data is None:
+        return render_template('errors/404.html')
+
     return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # Creates new venue
     # Variables
@@ -247,7 +463,7 @@ def create_venue_submission():
         return render_template('pages/home.html')
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     # Edits existing venue data
     # Query
@@ -276,7 +492,7 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     #Queries
     venue = db.session.query(Venue).filter_by(id=venue_id).first()
@@ -289,6 +505,7 @@ def edit_venue_submission(venue_id):
 
     # Updating database
     try:
+        artist_keys = venue_artist_keys(venue_id)
         venue.name = form.name.data
         venue.city = form.city.data
         venue.state = form.state.data
@@ -301,19 +518,20 @@ def edit_venue_submission(venue_id):
         venue.seeking_talent = form.seeking_talent.data == 'True'
         venue.seeking_description = form.seeking_description.data
         db.session.commit()
+        view_cache.invalidate(venue_key(venue_id), *artist_keys)
 
     except:
         flash(f"An error occurred. Venue {request.form['name']} could not be updated.")
         db.session.rollback()
-        return redirect(url_for('show_venue', venue_id=venue_id))
+        return redirect(url_for('.show_venue', venue_id=venue_id))
 
     finally:
         flash(f"Venue {request.form['name']} was successfully updated.")
         db.session.close()
-        return redirect(url_for('show_venue', venue_id=venue_id))
+        return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # Deletes a venue
     # Variables
@@ -321,8 +539,10 @@ def delete_venue(venue_id):
 
     # Updating database
     try:
+        artist_keys = venue_artist_keys(venue_id)
         db.session.query(Venue).filter_by(id=venue_id).delete()
         db.session.commit()
+        view_cache.invalidate(venue_key(venue_id), *artist_keys)
     except:
         error = True
         db.session.rollback()
@@ -333,105 +553,142 @@ def delete_venue(venue_id):
     # Show result message
     if not error:
         flash(f'Venue {venue_id} was successfully deleted.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     else:
         flash(f'An error occurred. Venue {venue_id} could not be deleted.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+def artist_listing(genres, state):
+    # Columns of ArtistRow for every artist matching the facets, by id
+    query = db.session.query(Artist.id, Artist.name).order_by(Artist.id)
+    return filter_by_facets(query, Artist, genres, state)
+
+
+@main.route('/artists')
 def artists():
-    # Shows all artists
+    # Shows all artists, optionally narrowed with ?genre=&state=
     # Queries
-    all_artists = db.session.query(Artist).all()
+    genres, state = facet_filters()
+    query = artist_listing(genres, state)
 
-    # Variables
-    data = []
+    after = request.args.get('after')
+    if after:
+        if not after.isdigit():
+            abort(400)
+        query = query.filter(Artist.id>int(after))
+
+    # yield_per goes on the listing query, a CoreQuery executes its own
+    # statement
+    listing = listing_query(query)
+    if is_streamed():
+        listing = listing.yield_per(current_app.config['STREAM_BATCH_SIZE'])
 
     # Formating data
-    for _row in all_artists:
-        data.append({
-            "id": _row.id,
-            "name": _row.name
-        })
-    return render_template('pages/artists.html', artists=data)
+    page = KeysetPage(
+        listing, page_limit(),
+        cursor_for=lambda row: str(row.id),
+        formatter=lambda row: ArtistRow(*row))
 
+    facets = facet_sidebar(Artist, genres, state)
+    if is_streamed():
+        return stream_template(
+            'pages/artists.html', artists=page, facets=facets)
+    return render_template('pages/artists.html', artists=page, facets=facets)
 
-@app.route('/artists/search', methods=['POST'])
+
+@main.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     # Seraches for an artist per search term
     # Queries
     search_term = request.form.get('search_term', '')
-    search_query = db.session.query(Artist).filter(
-        Artist.name.ilike(f'%{search_term}%')).all()
-
-    # Variables
-    data = []
-    response = {}
+    response = search.search(Artist, search_term)
 
     # Formating data
-    for _row in search_query:
-        artist_shows = db.session.query(Show).filter_by(
-            artist_id=_row.id).all()
-        data.append({
-            'id': _row.id,
-            'name': _row.name,
-            'num_upcomming_shows': len(db.session.query(Show).filter(
-                Show.artist_id == result.id).filter(
-                Show.start_time > datetime.now()).all())
-        })
-
-    response = {
-        'count': len(search_query),
-        'data': data
-    }
+    attach_show_counts(response['data'], Artist)
 
     return render_template(
         'pages/search_artists.html',
         results=response,
-        search_term=request.form.get('search_term', ''))
-
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # shows the artist page with the given venue_id
+        search_term=search_term)
+
+
+def fetch_artist(artist_id, now):
+    # Artist and its (venue_id, show_time, venue name, venue image, show
+    # id, show version, venue version) rows from one joined statement
+    artist_shows = db.session.query(
+        Artist, Show.venue_id, Show.show_time,
+        Venue.name, Venue.image_link,
+        Show.id, Show.version, Venue.version).outerjoin(
+        Show, Show.artist_id==Artist.id).outerjoin(
+        Venue, Venue.id==Show.venue_id).filter(
+        Artist.id==artist_id).order_by(Show.show_time).all()
+
+    if not artist_shows:
+        return None, []
+    return artist_shows[0].Artist, [row[1:] for row in artist_shows]
+
+
+def fetch_artist_concurrently(artist_id, now):
+    # Same as fetch_artist, with the artist, past and upcoming shows
+    # fetched by three statements running at the same time
+    shows = db.session.query(
+        Show.venue_id, Show.show_time,
+        Venue.name, Venue.image_link,
+        Show.id, Show.version, Venue.version).join(
+        Venue, Venue.id==Show.venue_id).filter(
+        Show.artist_id==artist_id).order_by(Show.show_time)
+
+    artists, past_shows, upcoming_shows = fetch_all(
+        db.session.query(Artist).filter(Artist.id==artist_id).statement,
+        shows.filter(Show.show_time<=now).statement,
+        shows.filter(Show.show_time>now).statement)
+
+    if not artists:
+        return None, []
+    return artists[0], past_shows + upcoming_shows
+
+
+def artist_page(artist_id):
+    # Builds the artist page payload, None if the artist doesn't exist
     # Queries
-    artist = db.session.query(Artist).filter_by(id=artist_id).first()
-
-    past_shows_query = db.session.query(Show).join(Venue).filter(
-        Show.artist_id==artist_id).filter(
-        Show.show_time<=datetime.now()).all()
+    now = datetime.now()
+    if current_app.config['DETAIL_QUERY_MODE'] == 'concurrent':
+        artist, artist_shows = fetch_artist_concurrently(artist_id, now)
+    else:
+        artist, artist_shows = fetch_artist(artist_id, now)
 
-    upcoming_shows_query = db.session.query(Show).join(Venue).filter(
-        Show.artist_id==artist_id).filter(
-        Show.show_time>datetime.now()).all()
+    if artist is None:
+        return None
 
     # Variables
     past_shows = []
     upcoming_shows = []
     data = {}
 
-    # Past shows data
-    for show in past_shows_query:
-        past_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": show.show_time.strftime('%Y-%m-%d %H:%M:%S')
-            })
-
-    # Upcoming shows data
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": show.show_time.strftime('%Y-%m-%d %H:%M:%S')
-            })
+    # Shows data
+    for venue_id, show_time, venue_name, venue_image_link, show_id, \
+            show_version, venue_version in artist_shows:
+        if show_time is None:
+            continue
+
+        show = {
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "venue_image_link": venue_image_link,
+            "start_time": show_time,
+            "fragment_key": fragment_key(
+                'artist-show', show_id, show_version, venue_version)
+        }
+        if show_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
 
     # Artist data
     data = {
@@ -451,11 +708,25 @@ def show_artist(artist_id):
         "past_shows_count": len(past_shows),
         "upcoming_shows_count": len(upcoming_shows)
     }
+    return data
+
+
+@main.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    data = view_cache.get_or_set(
+        artist_key(artist_id), lambda: artist_page(artist_id),
+        enabled=cache_enabled())
+
+    # Redirect to error page if nothing found
+    if data is None:
+        return render_template('errors/404.html')
+
     return render_template('pages/show_artist.html', artist=data)
 
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     # Edit artist existing data
     # Query
@@ -483,7 +754,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     #Queries
     artist = db.session.query(Artist).filter_by(id=artist_id).first()
@@ -496,6 +767,7 @@ def edit_artist_submission(artist_id):
 
     # Updating database
     try:
+        venue_keys = artist_venue_keys(artist_id)
         artist.name = form.name.data
         artist.city = form.city.data
         artist.state = form.state.data
@@ -508,38 +780,38 @@ def edit_artist_submission(artist_id):
         artist.seeking_description = form.seeking_description.data
 
         db.session.commit()
+        view_cache.invalidate(artist_key(artist_id), *venue_keys)
 
     except:
         flash(f"An error occurred. Artist {request.form['name']} could not be updated.")
         db.session.rollback()
-        return redirect(url_for('show_artist', artist_id=artist_id))
+        return redirect(url_for('.show_artist', artist_id=artist_id))
 
     finally:
         db.session.close()
         flash(f"Artist {request.form['name']} was succesfully updated.")
-        return redirect(url_for('show_artist', artist_id=artist_id))
+        return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 # Creates new artist
 def create_artist_submission():
      # Variables
     error = False
     form = ArtistForm(request.form)
-    print(form.seeking_venue.data)
     # Formating data
     new_artist = Artist(
         name=form.name.data,
@@ -574,7 +846,7 @@ def create_artist_submission():
         return render_template('pages/home.html')
 
 
-@app.route('/artists/<artist_id>', methods=['DELETE'])
+@main.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
     # Detetes artist
     # Variables
@@ -582,8 +854,10 @@ def delete_artist(artist_id):
 
     # Updating database
     try:
+        venue_keys = artist_venue_keys(artist_id)
         db.session.query(Artist).filter_by(id=artist_id).delete()
         db.session.commit()
+        view_cache.invalidate(artist_key(artist_id), *venue_keys)
     except:
         error = True
         db.session.rollback()
@@ -594,48 +868,216 @@ def delete_artist(artist_id):
     # Show result message
     if not error:
         flash(f'Artist {artist_id} was successfully deleted.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     else:
         flash(f'An error occurred. Venue {artist_id} could not be deleted.')
-        return redirect(url_for('index'))    
+        return redirect(url_for('.index'))    
 
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+def parse_window_bound(value, end=False):
+    if not value:
+        return None
+    bound = datetime.fromisoformat(value)
+    # Shows are stored in naive local time
+    if bound.tzinfo is not None:
+        raise ValueError('time zone offsets are not supported')
+    # A bare date as the upper bound includes that whole day
+    if end and len(value) == 10:
+        bound += timedelta(days=1)
+    return bound
+
+
+def show_filters():
+    # (start, end, city, genre) from ?from=&to=&city=&genre=, the window is
+    # start inclusive and end exclusive
+    try:
+        start = parse_window_bound(request.args.get('from'))
+        end = parse_window_bound(request.args.get('to'), end=True)
+    except ValueError:
+        abort(400)
+    city = request.args.get('city') or None
+    genre = request.args.get('genre') or None
+    return start, end, city, genre
+
+
+def filter_shows(query, start, end, city, genre):
+    # Narrows a Show query, joined to Venue for city and Artist for genre
+    if start is not None:
+        query = query.filter(Show.show_time>=start)
+    if end is not None:
+        query = query.filter(Show.show_time<end)
+    if city:
+        query = query.filter(Venue.city==city)
+    if genre:
+        query = query.filter(has_genres(Artist, [genre]))
+    return query
+
+
+def show_listing(start, end, city, genre):
+    # Columns of ShowRow for every dated show matching the filters, by time
+    query = db.session.query(
+        Show.id, Show.show_time, Show.venue_id,
+        Venue.name.label('venue_name'), Show.artist_id,
+        Artist.name.label('artist_name'), Artist.image_link,
+        Show.version, Venue.version.label('venue_version'),
+        Artist.version.label('artist_version')).join(
+        Artist, Artist.id==Show.artist_id).join(
+        Venue, Venue.id==Show.venue_id).filter(
+        Show.show_time.isnot(None)).order_by(Show.show_time, Show.id)
+    return filter_shows(query, start, end, city, genre)
+
+
+def shows_stamp():
+    # Changes whenever a show is added, edited or removed (the
+    # show_deletes counter), or a venue or artist is edited. Every part is
+    # read from an index or the single state row, so it stays cheap next
+    # to the listing itself.
+    parts = (
+        db.func.max(Show.updated_at), db.func.max(Show.id),
+        db.func.max(Venue.updated_at), db.func.max(Artist.updated_at))
+    show_deletes = db.select([db.column('show_deletes')]).select_from(
+        db.table('show_counter_state')).as_scalar()
+    return db.session.query(*(
+        db.session.query(part).as_scalar() for part in parts),
+        show_deletes).one()
+
+
+@main.route('/shows')
 def shows():
-    # displays list of shows at /shows
+    # displays list of shows at /shows, optionally narrowed with
+    # ?from=&to=&city=&genre=
     # Query
-    shows = db.session.query(Show).join(Artist).join(Venue).all()
-
-    # Variables
-    data = []
+    query = show_listing(*show_filters())
+
+    # Cursor is "<show_time isoformat>_<show id>" of the last row shown
+    after = request.args.get('after')
+    if after:
+        try:
+            after_time, after_id = after.rsplit('_', 1)
+            after_time = datetime.fromisoformat(after_time)
+            after_id = int(after_id)
+        except ValueError:
+            abort(400)
+        query = query.filter(
+            db.tuple_(Show.show_time, Show.id)>db.tuple_(after_time, after_id))
+
+    listing = listing_query(query)
+    if is_streamed():
+        listing = listing.yield_per(current_app.config['STREAM_BATCH_SIZE'])
+    else:
+        # A client with the current page gets a 304 before the listing is
+        # queried and rendered
+        etag = hashlib.md5(
+            repr((request.full_path, *shows_stamp())).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
 
     # Formating data
-    for show in shows:
-        data.append({
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.show_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
+    page = KeysetPage(
+        listing, page_limit(),
+        cursor_for=lambda row: f'{row.show_time.isoformat()}_{row.id}',
+        formatter=lambda row: ShowRow(*row))
+
+    if is_streamed():
+        return stream_template('pages/shows.html', shows=page)
+    response = make_response(render_template('pages/shows.html', shows=page))
+    response.set_etag(etag)
+    return response
+
+
+CALENDAR_BUCKETS = {'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+
+def calendar_counts(start, end, city, genre, bucket):
+    # [(bucket start, number of shows)], grouped and counted by the database
+    bucket_start = db.func.date_trunc(
+        db.literal_column(f"'{bucket}'"), Show.show_time)
+    query = db.session.query(bucket_start, db.func.count()).select_from(Show)
+    if city:
+        query = query.join(Venue, Venue.id==Show.venue_id)
+    if genre:
+        query = query.join(Artist, Artist.id==Show.artist_id)
+    query = filter_shows(query, start, end, city, genre)
+    return query.group_by(bucket_start).order_by(bucket_start).all()
+
+
+def calendar_page(start, end, city, genre, bucket):
+    # JSON body for /shows/calendar and its ETag
+    counts = {
+        bucket_start.date(): count for bucket_start, count in
+        calendar_counts(start, end, city, genre, bucket)}
+
+    # Every bucket of the window, empty ones included
+    day = start.date()
+    if bucket == 'week':
+        day -= timedelta(days=day.weekday())
+    buckets = []
+    while datetime.combine(day, datetime.min.time()) < end:
+        buckets.append({'start': day.isoformat(), 'count': counts.get(day, 0)})
+        day += CALENDAR_BUCKETS[bucket]
+
+    body = json.dumps({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'city': city,
+        'genre': genre,
+        'bucket': bucket,
+        'total': sum(counts.values()),
+        'buckets': buckets,
+    })
+    return {'body': body, 'etag': hashlib.md5(body.encode()).hexdigest()}
+
+
+@main.route('/shows/calendar')
+def shows_calendar():
+    # Number of shows per day or week as JSON:
+    # /shows/calendar?from=&to=&city=&genre=&bucket=<day|week>
+    # Defaults to CALENDAR_DEFAULT_DAYS days from today
+    start, end, city, genre = show_filters()
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in CALENDAR_BUCKETS:
+        abort(400)
+    if start is None:
+        start = datetime.combine(datetime.now().date(), datetime.min.time())
+    if end is None:
+        end = start + timedelta(
+            days=current_app.config['CALENDAR_DEFAULT_DAYS'])
+    if not start < end <= start + timedelta(
+            days=current_app.config['CALENDAR_MAX_DAYS']):
+        abort(400)
+
+    # Any new or edited show changes the key, deleted ones drop out when
+    # the entry expires
+    stamp = db.session.query(
+        db.func.max(Show.updated_at), db.func.max(Show.id)).one()
+    page = view_cache.get_or_set(
+        calendar_key(start, end, city, genre, bucket, *stamp),
+        lambda: calendar_page(start, end, city, genre, bucket),
+        enabled=cache_enabled())
+
+    response = Response(page['body'], mimetype='application/json')
+    response.set_etag(page['etag'])
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@main.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['GET', 'POST'])
+@main.route('/shows/create', methods=['GET', 'POST'])
 def create_show_submission():
 
     # Varables
     error = False
+    conflict = None
     form = ShowForm(request.form)
 
     #Formating data
@@ -645,44 +1087,196 @@ def create_show_submission():
                 new_show = Show(
                     form.venue_id.data,
                     form.artist_id.data,
-                    form.start_time.data
+                    form.start_time.data,
+                    form.duration.data
                 )
+                # Across partitions the constraints can't see each other
+                conflict = boundary_conflict({
+                    'venue_id': new_show.venue_id,
+                    'artist_id': new_show.artist_id,
+                    'start_time': new_show.show_time,
+                    'duration': new_show.duration or DEFAULT_SHOW_DURATION,
+                })
+                if conflict:
+                    raise ValueError(f'{conflict} already booked')
                 db.session.add(new_show)
                 db.session.commit()
+                view_cache.invalidate(
+                    venue_key(form.venue_id.data),
+                    artist_key(form.artist_id.data))
             except:
                 error = True
+                # The overlap constraints make the check atomic with the
+                # insert
+                conflict = conflict or booking_conflict(sys.exc_info()[1])
 
                 db.session.rollback()
                 print(sys.exc_info())
             finally:
                 db.session.close()
+        else:
+            # Back to the form, saying what to fix
+            for field, messages in form.errors.items():
+                for message in messages:
+                    flash(f'{field}: {message}')
+            return render_template('forms/new_show.html', form=form)
     if not error:
          flash('Show was successfully created!')
          return render_template('pages/home.html')
+    elif conflict:
+        flash(f'The {conflict} is already booked at that time. '
+              'Show could not be listed.')
+        return render_template('pages/home.html')
     else:
         flash('An error occurred. Show could not be listed.')
         return render_template('pages/home.html')
 
-@app.errorhandler(404)
+
+@main.route('/shows/validate', methods=['POST'])
+@read_only
+def validate_shows():
+    # Checks many proposed shows for double bookings at once. Takes
+    # {"shows": [{"venue_id", "artist_id", "start_time", "duration"}]} and
+    # lists, per show, the existing shows and other proposals it overlaps.
+    payload = request.get_json(silent=True) or {}
+    shows = payload.get('shows')
+    if not isinstance(shows, list) or \
+            len(shows) > current_app.config['MAX_VALIDATE_SHOWS']:
+        abort(400)
+
+    # Variables
+    proposals = []
+    results = []
+
+    # Formating data
+    for index, show in enumerate(shows):
+        try:
+            proposal = {
+                'venue_id': int(show['venue_id']),
+                'artist_id': int(show['artist_id']),
+                'start_time': dateutil.parser.parse(show['start_time']),
+                'duration': int(
+                    show.get('duration') or DEFAULT_SHOW_DURATION),
+            }
+            if not 0 < proposal['duration'] <= MAX_SHOW_DURATION:
+                raise ValueError('duration out of range')
+        except (AttributeError, KeyError, TypeError, ValueError,
+                OverflowError) as e:
+            results.append({'index': index, 'valid': False, 'error': str(e)})
+            continue
+        proposal['index'] = index
+        proposals.append(proposal)
+        results.append(None)
+
+    # Queries
+    for proposal, conflicts in zip(proposals, find_conflicts(proposals)):
+        for conflict in conflicts:
+            if 'proposal' in conflict:
+                conflict['proposal'] = proposals[conflict['proposal']]['index']
+        results[proposal['index']] = {
+            'index': proposal['index'],
+            'valid': not conflicts,
+            'conflicts': conflicts,
+        }
+
+    return jsonify({
+        'valid': all(result['valid'] for result in results),
+        'shows': results,
+    })
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(QueryTimeout)
+def query_timeout_error(error):
+    return render_template('errors/500.html'), 504
+
+
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# App Config.
+#----------------------------------------------------------------------------#
+
+
+def create_app(config='config'):
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    # Every worker must share the key, or sessions and flashed messages
+    # break as soon as a request hits another worker
+    if not app.config['SECRET_KEY']:
+        if not app.debug:
+            raise RuntimeError('SECRET_KEY must be set.')
+        app.config['SECRET_KEY'] = os.urandom(32)
+
+    # The flask command loads the app from within its click context
+    cli = click.get_current_context(silent=True) is not None
+    pooling.init_app(app, cli)
+    db.init_app(app)
+    moment.init_app(app)
+    migrate.init_app(app, db)
+    view_cache.init_app(app)
+    fragment_cache.init_app(app)
+    metrics.init_app(app)
+    replica_router.init_app(app)
+    assets.init_app(app)
+    with app.app_context():
+        for name, engine in replicas.engines(app).items():
+            pooling.instrument(engine, app.config, name)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+            app.config['TEMPLATE_CACHE_DIR'])
+
+    app.register_blueprint(main)
+    app.register_blueprint(exporter.exports)
+    app.cli.add_command(seed.seed_command)
+    app.cli.add_command(importer.import_command)
+    app.cli.add_command(exporter.export_command)
+    app.cli.add_command(assets_command)
+    app.cli.add_command(geo.backfill_command)
+    app.cli.add_command(counters.roll_command)
+    app.cli.add_command(counters.check_command)
+    app.cli.add_command(partitions.partitions_command)
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
+
+def warmup(app):
+    # Run once in the master process before workers fork (gunicorn
+    # --preload): compiles every template into the bytecode cache, primes
+    # the date formats and checks the database is reachable
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+    for format in DATETIME_FORMATS:
+        format_datetime(datetime.now(), format)
+
+    with app.app_context():
+        for engine in replicas.engines(app).values():
+            engine.connect().close()
+            # Sockets must not be shared with forked workers, they open
+            # their own pool in post_fork (see gunicorn.conf.py)
+            engine.dispose()
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -690,11 +1284,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run(host='192.168.1.173', port=8000)
+    create_app().run(host='192.168.1.173', port=8000)
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    from werkzeug.utils import safe_join
+except ImportError:
+    # Werkzeug < 2.0
+    from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# `flask assets` copies static/ to static/dist/ under content hashed names,
+# e.g. css/main.css -> dist/css/main.3f2a9c0b1d4e.css, next to .gz and .br
+# variants, and writes a manifest of the original to the hashed names.
+# Once the manifest exists url_for('static', filename='css/main.css') points
+# to the hashed file, served with the precompressed variant the client
+# accepts and cached for a year, since its name changes with its content.
+# Brotli variants need the optional brotli package.
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.ico'}
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _fingerprint(name, data):
+    digest = hashlib.md5(data).hexdigest()[:12]
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+
+def _rewrite_css(name, data, manifest):
+    # Points url() references at the hashed files, relative to the hashed
+    # stylesheet which lives at the same depth under dist/
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        path, sep, fragment = url.partition('#')
+        path, qsep, query = path.partition('?')
+        if '://' in path or path.startswith(('/', 'data:')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(directory, path))
+        if target not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[target], posixpath.join(
+            DIST, directory or '.'))
+        return f'url({quote}{hashed}{qsep}{query}{sep}{fragment}{quote})'
+
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def _compress(path, data):
+    # Writes the .gz and .br variants that are smaller than the original
+    variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as output:
+                output.write(compressed)
+
+
+def build(static_folder, clean=False):
+    # Fingerprints and precompresses every file in static_folder, returns
+    # the manifest. Stylesheets go last so their url() references can be
+    # rewritten to hashed names.
+    dist = os.path.join(static_folder, DIST)
+    if clean and os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d != DIST]
+        for filename in files:
+            if filename.startswith('.'):
+                continue
+            path = os.path.relpath(os.path.join(root, filename), static_folder)
+            names.append(path.replace(os.sep, '/'))
+    names.sort(key=lambda name: (name.endswith('.css'), name))
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as source:
+            data = source.read()
+        if name.endswith('.css'):
+            data = _rewrite_css(name, data, manifest)
+
+        hashed = posixpath.join(DIST, _fingerprint(name, data))
+        path = os.path.join(static_folder, *hashed.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output:
+            output.write(data)
+        if posixpath.splitext(name)[1] in COMPRESSIBLE:
+            _compress(path, data)
+        manifest[name] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w') as output:
+        json.dump(manifest, output, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    # Serves the output of `flask assets`: rewrites static URLs to hashed
+    # names and sends hashed files precompressed with long lived caching
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = app.config['ASSETS_MANIFEST']
+        if path and os.path.exists(path):
+            with open(path) as source:
+                self.manifest = json.load(source)
+        if not self.manifest:
+            return
+        app.url_defaults(self.url_defaults)
+        app.view_functions['static'] = self.send_static_file
+
+    def url_defaults(self, endpoint, values):
+        # url_for('static', filename=...) resolves to the hashed file
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def send_static_file(self, filename):
+        if not filename.startswith(DIST + '/'):
+            return current_app.send_static_file(filename)
+
+        folder = current_app.static_folder
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for name, suffix in ENCODINGS:
+            # None for a path escaping the folder, which then 404s below
+            path = safe_join(folder, filename + suffix)
+            if request.accept_encodings[name] and path and \
+                    os.path.exists(path):
+                encoding = name
+                filename += suffix
+                break
+
+        max_age = current_app.config['STATIC_MAX_AGE']
+        response = send_from_directory(
+            folder, filename, mimetype=mimetype, cache_timeout=max_age)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+@click.command('assets')
+@click.option('--clean', is_flag=True,
+              help='Remove previously built files first.')
+@with_appcontext
+def assets_command(clean):
+    """Fingerprint and precompress the files in static/."""
+    manifest = build(current_app.static_folder, clean)
+    click.echo(f'Built {len(manifest)} assets'
+               + ('' if brotli else ', brotli not installed') + '.')
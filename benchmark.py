@@ -0,0 +1,361 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import (
+    create_app, fragment_cache, view_cache, venue_listing, artist_listing,
+    show_listing)
+from cache import MemoryBackend
+from listings import ArtistRow, ShowRow, VenueRow, listing_query
+from models import db, Venue, Artist, Show
+
+app = create_app()
+
+#----------------------------------------------------------------------------#
+# Benchmark.
+#----------------------------------------------------------------------------#
+
+# Runs every route through the Flask test client against the configured
+# database (fill it with `flask seed` first) and writes a JSON report:
+#
+#   $ python benchmark.py --requests 50 --output bench.json
+#   $ python benchmark.py --baseline bench.json
+#
+# --latency adds a fixed delay to every SQL statement to simulate a distant
+# database, e.g. to compare the detail page query modes:
+#
+#   $ python benchmark.py --no-cache --latency 20 --output single.json
+#   $ python benchmark.py --no-cache --latency 20 --detail-mode concurrent \
+#         --baseline single.json
+#
+# --listings times the listing queries alone, from statement to row
+# objects, once through the ORM and once through Core:
+#
+#   $ python benchmark.py --listings --rows 10000
+#
+# Listings also run with their ?genre=, ?state=, date window and ?stream=1
+# variants. DELETE routes are left out as they would destroy the data
+# set.
+
+
+class SimulatedLatency:
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        event.listen(Engine, 'before_cursor_execute', self._sleep)
+
+    def _sleep(self, *args):
+        time.sleep(self.seconds)
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def build_routes():
+    # (name, method, path, data) for every route of the app, data is form
+    # fields or a JSON string
+    with app.app_context():
+        venue = db.session.query(Venue).order_by(Venue.id).first()
+        artist = db.session.query(Artist).order_by(Artist.id).first()
+
+    if venue is None or artist is None:
+        raise SystemExit('No data to benchmark, run `flask seed` first.')
+
+    show_time = (datetime.now() + timedelta(days=30)).strftime(
+        '%Y-%m-%d %H:%M:%S')
+    venue_form = {
+        'name': venue.name, 'city': venue.city, 'state': venue.state,
+        'address': venue.address, 'phone': venue.phone,
+        'genres': venue.genres, 'facebook_link': venue.facebook_link,
+        'website': venue.website, 'image_link': venue.image_link,
+        'seeking_talent': 'True' if venue.seeking_talent else 'False',
+        'seeking_description': venue.seeking_description or '',
+    }
+    artist_form = {
+        'name': artist.name, 'city': artist.city, 'state': artist.state,
+        'phone': artist.phone, 'genres': artist.genres,
+        'facebook_link': artist.facebook_link, 'website': artist.website,
+        'image_link': artist.image_link,
+        'seeking_venue': 'True' if artist.seeking_venue else 'False',
+        'seeking_description': artist.seeking_description or '',
+    }
+    show_form = {
+        'venue_id': venue.id, 'artist_id': artist.id,
+        'start_time': show_time,
+    }
+    search_term = venue.name.split()[0]
+    genre = (venue.genres or ['Jazz'])[0]
+    window_start = datetime.now().date()
+    window = f'from={window_start}&to={window_start + timedelta(days=30)}'
+    validate_payload = json.dumps({'shows': [
+        dict(show_form, duration=120),
+        dict(show_form, artist_id=artist.id + 1, duration=60),
+    ]})
+
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('venues_by_genre', 'GET', f'/venues?genre={genre}', None),
+        ('venues_by_state', 'GET', f'/venues?state={venue.state}', None),
+        ('nearby_venues', 'GET', '/venues/nearby?lat=30.2672&lng=-97.7431',
+            None),
+        ('search_venues', 'POST', '/venues/search',
+            {'search_term': search_term}),
+        ('show_venue', 'GET', f'/venues/{venue.id}', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('create_venue_submission', 'POST', '/venues/create', venue_form),
+        ('edit_venue', 'GET', f'/venues/{venue.id}/edit', None),
+        ('edit_venue_submission', 'POST', f'/venues/{venue.id}/edit',
+            venue_form),
+        ('artists', 'GET', '/artists', None),
+        ('artists_by_genre', 'GET', f'/artists?genre={genre}', None),
+        ('artists_by_state', 'GET', f'/artists?state={artist.state}', None),
+        ('artists_streamed', 'GET', '/artists?stream=1', None),
+        ('search_artists', 'POST', '/artists/search',
+            {'search_term': search_term}),
+        ('show_artist', 'GET', f'/artists/{artist.id}', None),
+        ('edit_artist', 'GET', f'/artists/{artist.id}/edit', None),
+        ('edit_artist_submission', 'POST', f'/artists/{artist.id}/edit',
+            artist_form),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('create_artist_submission', 'POST', '/artists/create', artist_form),
+        ('shows', 'GET', '/shows', None),
+        ('shows_by_genre', 'GET', f'/shows?genre={genre}', None),
+        ('shows_in_window', 'GET', f'/shows?{window}&city={venue.city}',
+            None),
+        ('shows_streamed', 'GET', '/shows?stream=1', None),
+        ('shows_calendar', 'GET', f'/shows/calendar?{window}', None),
+        ('shows_calendar_weeks', 'GET',
+            f'/shows/calendar?{window}&genre={genre}&bucket=week', None),
+        ('create_shows', 'GET', '/shows/create', None),
+        ('create_show_submission', 'POST', '/shows/create', show_form),
+        ('validate_shows', 'POST', '/shows/validate', validate_payload),
+        ('export_venues', 'GET', '/export/venues?format=csv', None),
+        ('export_artists', 'GET', '/export/artists', None),
+        ('export_shows', 'GET', '/export/shows?format=csv&gzip=1', None),
+        ('metrics', 'GET', '/metrics', None),
+        ('cache_stats', 'GET', '/cache/stats', None),
+    ]
+
+
+def run(requests, warmup):
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    counter = QueryCounter()
+    report = {}
+
+    for name, method, path, data in build_routes():
+        def call():
+            response = client.open(
+                path, method=method, data=data,
+                content_type='application/json'
+                if isinstance(data, str) else None)
+            response.get_data()
+            return response.status_code
+
+        for _ in range(warmup):
+            call()
+
+        latencies = []
+        statuses = set()
+        queries = counter.count
+        for _ in range(requests):
+            started = time.perf_counter()
+            statuses.add(call())
+            latencies.append(time.perf_counter() - started)
+        queries = (counter.count - queries) / requests
+
+        # Separate pass, tracemalloc would skew the latencies above
+        tracemalloc.start()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report[name] = {
+            'method': method,
+            'path': path,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'queries_per_request': queries,
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    return report
+
+
+LISTINGS = [
+    ('venues', lambda: venue_listing([], None), VenueRow),
+    ('artists', lambda: artist_listing([], None), ArtistRow),
+    ('shows', lambda: show_listing(None, None, None, None), ShowRow),
+]
+
+
+def run_listings(rows, repeats):
+    # Rows per second and peak allocations of each listing query per
+    # LISTING_QUERY_MODE, template rendering left out
+    report = {}
+    with app.app_context():
+        for name, build, row_class in LISTINGS:
+            report[name] = {}
+            for mode in ('orm', 'core'):
+                def call():
+                    query = build()
+                    if rows:
+                        query = query.limit(rows)
+                    return [row_class(*row)
+                            for row in listing_query(query, mode)]
+
+                call()
+                count = 0
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    count += len(call())
+                elapsed = time.perf_counter() - started
+
+                tracemalloc.start()
+                call()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                report[name][mode] = {
+                    'rows': count // repeats,
+                    'rows_per_second': round(count / elapsed),
+                    'peak_memory_kb': round(peak / 1024, 1),
+                }
+            db.session.remove()
+    return report
+
+
+def print_listings(listings):
+    for name, modes in listings.items():
+        orm, core = modes['orm'], modes['core']
+        speedup = core['rows_per_second'] / orm['rows_per_second'] \
+            if orm['rows_per_second'] else 0
+        print(f'{name}: {core["rows"]} rows, '
+              f'orm {orm["rows_per_second"]} rows/s '
+              f'{orm["peak_memory_kb"]} KB, '
+              f'core {core["rows_per_second"]} rows/s '
+              f'{core["peak_memory_kb"]} KB ({speedup:.2f}x)')
+
+
+def dataset_size():
+    with app.app_context():
+        return {
+            'venues': db.session.query(Venue).count(),
+            'artists': db.session.query(Artist).count(),
+            'shows': db.session.query(Show).count(),
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    # Prints the relative change of each metric against a previous report
+    for name, current in report.get('routes', {}).items():
+        previous = baseline.get('routes', {}).get(name)
+        if previous is None:
+            continue
+        changes = []
+        for metric in ('p50_ms', 'p99_ms', 'queries_per_request',
+                       'peak_memory_kb'):
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before * 100 if before else 0
+            changes.append(f'{metric} {before} -> {after} ({change:+.1f}%)')
+        print(f'{name}: ' + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark every Fyyur route.')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=3,
+                        help='Untimed requests per route.')
+    parser.add_argument('--output', default='benchmark_report.json',
+                        help='Where to write the JSON report.')
+    parser.add_argument('--baseline',
+                        help='Previous report to compare against.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Milliseconds added to every SQL statement.')
+    parser.add_argument('--detail-mode', choices=['single', 'concurrent'],
+                        help='Overrides DETAIL_QUERY_MODE.')
+    parser.add_argument('--listing-mode', choices=['orm', 'core'],
+                        help='Overrides LISTING_QUERY_MODE.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the view and fragment caches.')
+    parser.add_argument('--listings', action='store_true',
+                        help='Compare the listing queries through the ORM '
+                             'and through Core instead of the routes.')
+    parser.add_argument('--rows', type=int, default=0,
+                        help='Rows per listing query with --listings, '
+                             '0 for all.')
+    args = parser.parse_args()
+
+    if args.detail_mode:
+        app.config['DETAIL_QUERY_MODE'] = args.detail_mode
+    if args.listing_mode:
+        app.config['LISTING_QUERY_MODE'] = args.listing_mode
+    if args.no_cache:
+        view_cache.backend = MemoryBackend(0, 0)
+        fragment_cache.backend = MemoryBackend(0, 0)
+    if args.latency:
+        SimulatedLatency(args.latency / 1000)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'requests_per_route': args.requests,
+        'latency_ms': args.latency,
+        'detail_mode': app.config['DETAIL_QUERY_MODE'],
+        'listing_mode': app.config['LISTING_QUERY_MODE'],
+        'view_cache': not args.no_cache,
+        'dataset': dataset_size(),
+    }
+    if args.listings:
+        report['listings'] = run_listings(args.rows, args.requests)
+        print_listings(report['listings'])
+    else:
+        report['routes'] = run(args.requests, args.warmup)
+
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+        output.write('\n')
+    print(f'Wrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(report, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
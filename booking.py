@@ -0,0 +1,157 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from models import db, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Double booking.
+#----------------------------------------------------------------------------#
+
+# A show occupies its venue and its artist over
+# [show_time, show_time + duration minutes). The show_booking_constraints
+# migration enforces this with two exclusion constraints, so an insert
+# that overlaps another show fails atomically with exclusion_violation.
+# find_conflicts asks the same GiST indexes about many proposals at once.
+# Show is partitioned by year and each partition has its own constraints,
+# so shows close to a new year are also checked by boundary_conflict. That
+# check runs under transaction advisory locks on the venue and the artist
+# (lock_bookings), or two overlapping shows on either side of the new year
+# could both pass it.
+
+EXCLUSION_VIOLATION = '23P01'
+# Suffixes of the per partition constraint names
+CONSTRAINTS = {
+    '_venue_overlap': 'venue',
+    '_artist_overlap': 'artist',
+}
+
+# Must stay identical to the constraint expression for the index to be used
+SHOW_RANGE = (
+    "tsrange(s.show_time, s.show_time + s.duration * interval '1 minute')")
+
+CONFLICTS_SQL = f'''
+WITH p AS (
+    SELECT * FROM unnest(
+        CAST(:proposals AS integer[]), CAST(:venue_ids AS integer[]),
+        CAST(:artist_ids AS integer[]), CAST(:starts AS timestamp[]),
+        CAST(:ends AS timestamp[]))
+    AS p(proposal, venue_id, artist_id, starts, ends)
+)
+SELECT p.proposal, 'venue' AS kind, s.id AS show_id
+FROM p JOIN "Show" s ON s.venue_id = p.venue_id
+    AND s.show_time IS NOT NULL
+    AND {SHOW_RANGE} && tsrange(p.starts, p.ends)
+UNION ALL
+SELECT p.proposal, 'artist' AS kind, s.id AS show_id
+FROM p JOIN "Show" s ON s.artist_id = p.artist_id
+    AND s.show_time IS NOT NULL
+    AND {SHOW_RANGE} && tsrange(p.starts, p.ends)
+ORDER BY 1, 3
+'''
+
+# First key of pg_advisory_xact_lock(key, id), per kind of booked id
+LOCK_NAMESPACES = {
+    'venue': 1,
+    'artist': 2,
+}
+
+# Taken in key order, so concurrent bookings can't deadlock
+LOCK_SQL = '''
+SELECT pg_advisory_xact_lock(k.namespace, k.id)
+FROM unnest(CAST(:namespaces AS integer[]), CAST(:ids AS integer[]))
+AS k(namespace, id)
+ORDER BY k.namespace, k.id
+'''
+
+
+def booking_conflict(error):
+    # 'venue' or 'artist' when an IntegrityError comes from one of the
+    # overlap constraints, None otherwise
+    orig = getattr(error, 'orig', None)
+    if getattr(orig, 'pgcode', None) != EXCLUSION_VIOLATION:
+        return None
+    for suffix, kind in CONSTRAINTS.items():
+        if (orig.diag.constraint_name or '').endswith(suffix):
+            return kind
+    return None
+
+
+def _end(proposal):
+    return proposal['start_time'] + timedelta(minutes=proposal['duration'])
+
+
+def _batch_conflicts(proposals, conflicts):
+    # Overlaps between the proposals themselves, per venue and per artist
+    for kind in ('venue', 'artist'):
+        groups = defaultdict(list)
+        for index, proposal in enumerate(proposals):
+            groups[proposal[f'{kind}_id']].append(index)
+        for indexes in groups.values():
+            indexes.sort(key=lambda index: proposals[index]['start_time'])
+            active = []
+            for index in indexes:
+                start = proposals[index]['start_time']
+                active = [other for other in active
+                          if _end(proposals[other]) > start]
+                for other in active:
+                    conflicts[index].append({'kind': kind, 'proposal': other})
+                    conflicts[other].append({'kind': kind, 'proposal': index})
+                active.append(index)
+
+
+def find_conflicts(proposals):
+    # For each proposal ({'venue_id', 'artist_id', 'start_time',
+    # 'duration'}), the existing shows and other proposals it overlaps.
+    # Existing shows are checked with a single statement.
+    conflicts = [[] for _ in proposals]
+    if not proposals:
+        return conflicts
+
+    rows = db.session.execute(text(CONFLICTS_SQL), {
+        'proposals': list(range(len(proposals))),
+        'venue_ids': [proposal['venue_id'] for proposal in proposals],
+        'artist_ids': [proposal['artist_id'] for proposal in proposals],
+        'starts': [proposal['start_time'] for proposal in proposals],
+        'ends': [_end(proposal) for proposal in proposals],
+    })
+    for index, kind, show_id in rows:
+        conflicts[index].append({'kind': kind, 'show_id': show_id})
+
+    _batch_conflicts(proposals, conflicts)
+    return conflicts
+
+
+def near_boundary(proposal):
+    # Whether the show could overlap a show in the neighbouring partition
+    start = proposal['start_time']
+    margin = timedelta(minutes=MAX_SHOW_DURATION)
+    return not (start - margin).year == start.year == _end(proposal).year
+
+
+def lock_bookings(proposals):
+    # Holds the venues and artists of the proposals until the transaction
+    # ends, so a check and the insert after it can't interleave with
+    # another booking of the same venue or artist
+    keys = sorted({
+        (namespace, proposal[f'{kind}_id'])
+        for proposal in proposals
+        for kind, namespace in LOCK_NAMESPACES.items()})
+    if not keys:
+        return
+    db.session.execute(text(LOCK_SQL), {
+        'namespaces': [namespace for namespace, _ in keys],
+        'ids': [id for _, id in keys],
+    })
+
+
+def boundary_conflict(proposal):
+    # 'venue' or 'artist' when a show close enough to a new year to
+    # overlap a show in the neighbouring partition does, None otherwise.
+    # The caller inserts the show in the same transaction.
+    if not near_boundary(proposal):
+        return None
+    lock_bookings([proposal])
+    conflicts = find_conflicts([proposal])[0]
+    return conflicts[0]['kind'] if conflicts else None
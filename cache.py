@@ -0,0 +1,293 @@
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+
+class MemoryBackend:
+    # In-process LRU with a per-entry TTL
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def get_many(self, keys):
+        # {key: value} for the keys found
+        with self._lock:
+            values = {key: self._get(key) for key in keys}
+        return {
+            key: value for key, value in values.items() if value is not None}
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    # Store shared by every worker on the host, backed by a local SQLite file
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, expires REAL, value BLOB)')
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires >= ?',
+            (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self._connection().execute(
+            'SELECT key, value FROM cache WHERE expires >= ? AND key IN (%s)'
+            % ', '.join('?' * len(keys)), [time.time()] + keys)
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, ttl=None):
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, expires, value) '
+            'VALUES (?, ?, ?)',
+            (key, time.time() + (self.ttl if ttl is None else ttl),
+             pickle.dumps(value)))
+        # Evict expired entries first, then the ones closest to expiring
+        connection.execute(
+            'DELETE FROM cache WHERE expires < ? OR key IN ('
+            'SELECT key FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)',
+            (time.time(), self.max_entries))
+
+    def delete(self, *keys):
+        self._connection().executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+#----------------------------------------------------------------------------#
+# View cache.
+#----------------------------------------------------------------------------#
+
+
+class ViewCache:
+    # Read-through cache for assembled view payloads
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.backend = create_backend(app.config)
+
+    def get_or_set(self, key, builder, enabled=True, ttl=None):
+        # Returns the cached payload for key, building and storing it on a
+        # miss. Payloads built as None are not cached. ttl overrides the
+        # backend's default lifetime.
+        if not enabled:
+            return builder()
+
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = builder()
+        if value is not None:
+            self.backend.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def venue_key(venue_id):
+    return f'venue:{venue_id}'
+
+
+def artist_key(artist_id):
+    return f'artist:{artist_id}'
+
+
+def facets_key(*parts):
+    return 'facets:' + ':'.join(str(part) for part in parts)
+
+
+def calendar_key(*parts):
+    return 'calendar:' + ':'.join(str(part) for part in parts)
+
+
+def create_backend(config, prefix='CACHE'):
+    # Backend from the <prefix>_BACKEND, _PATH, _MAX_ENTRIES and _TTL settings
+    if config[f'{prefix}_BACKEND'] == 'sqlite':
+        return SQLiteBackend(
+            config[f'{prefix}_PATH'], config[f'{prefix}_MAX_ENTRIES'],
+            config[f'{prefix}_TTL'])
+    return MemoryBackend(
+        config[f'{prefix}_MAX_ENTRIES'], config[f'{prefix}_TTL'])
+
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+# Tiles are wrapped in {% cache row.fragment_key %} ... {% endcache %} and
+# rendered once per key. Keys carry the version of every row a tile shows,
+# so an edit changes the key and stale tiles just age out of the LRU.
+# Looping over `rows|prefetch_fragments` fetches the tiles of each batch
+# with one backend lookup instead of one per tag.
+
+
+def fragment_key(kind, *parts):
+    return ':'.join(['fragment', kind] + [str(part) for part in parts])
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [key]), [], [], body).set_lineno(
+            lineno)
+
+    def _render(self, key, caller):
+        return self.environment.fragment_cache.render(key, caller)
+
+
+class FragmentCache:
+    # Rendered template fragments, along with what they took to render so
+    # stats() can tell how much render time the hits saved
+
+    PREFETCH_BATCH_SIZE = 100
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.render_time = 0
+        self.saved_time = 0
+
+    def init_app(self, app):
+        self.backend = create_backend(app.config, 'FRAGMENT_CACHE')
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.extend(fragment_cache=self)
+        app.jinja_env.filters['prefetch_fragments'] = self.prefetch
+
+    def _prefetched(self):
+        # Fragments looked up ahead of their tag during this request
+        if 'fragments' not in g:
+            g.fragments = {}
+        return g.fragments
+
+    def prefetch(self, rows):
+        # Yields rows unchanged, fetching the fragments of each batch first
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.PREFETCH_BATCH_SIZE:
+                yield from self._prefetch_batch(batch)
+                batch = []
+        yield from self._prefetch_batch(batch)
+
+    def _prefetch_batch(self, rows):
+        keys = [row['fragment_key'] for row in rows]
+        found = self.backend.get_many(keys)
+        prefetched = self._prefetched()
+        for key in keys:
+            prefetched[key] = found.get(key)
+        return rows
+
+    def render(self, key, caller):
+        prefetched = self._prefetched()
+        if key in prefetched:
+            entry = prefetched.pop(key)
+        else:
+            entry = self.backend.get(key)
+
+        if entry is not None:
+            html, cost = entry
+            self.hits += 1
+            self.saved_time += cost
+            return Markup(html)
+
+        started = time.perf_counter()
+        html = caller()
+        cost = time.perf_counter() - started
+        self.misses += 1
+        self.render_time += cost
+        self.backend.set(key, (str(html), cost))
+        return Markup(html)
+
+    def stats(self):
+        total = self.render_time + self.saved_time
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'render_seconds': self.render_time,
+            'saved_seconds': self.saved_time,
+            'saved_ratio': self.saved_time / total if total else 0,
+        }
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from metrics import RequestStats, current_stats, track
+from replicas import current_engine
+
+#----------------------------------------------------------------------------#
+# Concurrent queries.
+#----------------------------------------------------------------------------#
+
+# Independent statements of one request run at the same time, each on its
+# own pooled connection, so a page pays for the slowest round trip instead
+# of the sum of them. The pool threads are started lazily, after gunicorn
+# has forked the workers.
+#
+# A timed out future can't be stopped once its statement runs, so each
+# statement also gets CONCURRENT_QUERY_TIMEOUT as its statement_timeout
+# and gives its connection back when the request gives up on it. The pool
+# threads run outside the request context, their statements are counted
+# in the request metrics through metrics.track.
+
+_executor = None
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = '57014'
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['CONCURRENT_QUERY_WORKERS'],
+            thread_name_prefix='fyyur-query')
+    return _executor
+
+
+def _fetch(engine, statement, timeout, stats):
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            connection.execute(text(
+                'SET LOCAL statement_timeout = %d' % (timeout * 1000)))
+        with track(stats):
+            return connection.execute(statement).fetchall()
+
+
+def fetch_all(*statements):
+    # Returns the rows of every statement, in order. Raises QueryTimeout
+    # when they don't all finish within CONCURRENT_QUERY_TIMEOUT seconds.
+    engine = current_engine()
+    executor = _get_executor()
+    timeout = current_app.config['CONCURRENT_QUERY_TIMEOUT']
+    request_stats = current_stats()
+    thread_stats = [
+        RequestStats() if request_stats is not None else None
+        for _ in statements]
+    futures = [
+        executor.submit(_fetch, engine, statement, timeout, stats)
+        for statement, stats in zip(statements, thread_stats)]
+
+    _, pending = wait(futures, timeout=timeout)
+    if request_stats is not None:
+        for stats in thread_stats:
+            request_stats.merge(stats)
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise QueryTimeout()
+
+    try:
+        return [future.result() for future in futures]
+    except OperationalError as error:
+        # The server's timeout can fire just before the wait's
+        if getattr(error.orig, 'pgcode', None) == QUERY_CANCELED:
+            raise QueryTimeout()
+        raise
@@ -0,0 +1,144 @@
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_show_count and past_show_count, kept up
+# to date by statement triggers on Show, one grouped UPDATE per table and
+# statement (see the show_counters and statement_show_counters
+# migrations). A show counts as upcoming when it starts after
+# show_counter_state.rolled_at rather than after now(), so inserts and
+# deletes only touch their own venue and artist. `flask roll-show-counters`
+# moves the shows started since then from upcoming to past and advances
+# rolled_at, it should run every few minutes. The trigger and the roll-over
+# both lock the state row, so a show is never counted on the wrong side.
+
+TABLES = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+ROLL_SQL = '''
+WITH moved AS (
+    SELECT venue_id, artist_id FROM "Show"
+    WHERE show_time > :rolled_at AND show_time <= :now
+), venues AS (
+    UPDATE "Venue" v SET
+        upcoming_show_count = v.upcoming_show_count - m.shows,
+        past_show_count = v.past_show_count + m.shows
+    FROM (SELECT venue_id, count(*) AS shows FROM moved GROUP BY venue_id) m
+    WHERE v.id = m.venue_id
+), artists AS (
+    UPDATE "Artist" a SET
+        upcoming_show_count = a.upcoming_show_count - m.shows,
+        past_show_count = a.past_show_count + m.shows
+    FROM (SELECT artist_id, count(*) AS shows FROM moved GROUP BY artist_id) m
+    WHERE a.id = m.artist_id
+)
+SELECT count(*) FROM moved
+'''
+
+# Recomputes every counter as of rolled_at, returning the rows that were
+# off with their stored values
+REBUILD_SQL = '''
+WITH actual AS (
+    SELECT t.id,
+        count(s.id) FILTER (WHERE s.show_time > :rolled_at) AS upcoming,
+        count(s.id) FILTER (WHERE s.show_time <= :rolled_at) AS past
+    FROM "{table}" t LEFT JOIN "Show" s ON s.{column} = t.id
+    GROUP BY t.id
+)
+UPDATE "{table}" t SET
+    upcoming_show_count = actual.upcoming,
+    past_show_count = actual.past
+FROM actual, "{table}" stored
+WHERE t.id = actual.id AND stored.id = actual.id
+    AND (stored.upcoming_show_count, stored.past_show_count)
+        IS DISTINCT FROM (actual.upcoming, actual.past)
+RETURNING t.id, stored.upcoming_show_count, stored.past_show_count,
+    actual.upcoming, actual.past
+'''
+
+
+def lock_state():
+    # rolled_at, holding off the trigger until the transaction ends
+    return db.session.execute(text(
+        'SELECT rolled_at FROM show_counter_state FOR UPDATE')).scalar()
+
+
+def roll_over(now=None):
+    # Moves the shows that started since the last roll-over to the past
+    # counters, returns how many shows moved
+    now = now or datetime.now()
+    rolled_at = lock_state()
+    if now <= rolled_at:
+        db.session.rollback()
+        return 0
+
+    moved = db.session.execute(
+        text(ROLL_SQL), {'rolled_at': rolled_at, 'now': now}).scalar()
+    db.session.execute(
+        text('UPDATE show_counter_state SET rolled_at = :now'), {'now': now})
+    db.session.commit()
+    return moved
+
+
+def rebuild(dry_run=False):
+    # {table: [(id, stored upcoming, stored past, upcoming, past)]} of the
+    # rows whose counters drifted, fixed unless dry_run
+    rolled_at = lock_state()
+    drift = {}
+    for table, column in TABLES:
+        drift[table] = db.session.execute(
+            text(REBUILD_SQL.format(table=table, column=column)),
+            {'rolled_at': rolled_at}).fetchall()
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return drift
+
+
+def _require_postgres():
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Show counters need PostgreSQL.')
+
+
+@click.command('roll-show-counters')
+@click.option('--interval', type=int, default=0,
+              help='Keep running, rolling over every INTERVAL seconds.')
+@with_appcontext
+def roll_command(interval):
+    """Move shows that have started from upcoming to past counters."""
+    _require_postgres()
+    while True:
+        click.echo(f'Moved {roll_over()} shows to the past.')
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@click.command('check-show-counters')
+@click.option('--dry-run', is_flag=True,
+              help='Report drift without fixing it.')
+@click.option('--show', 'examples', default=10,
+              help='Drifted rows to list per table.')
+@with_appcontext
+def check_command(dry_run, examples):
+    """Recompute the show counters in bulk and report drift."""
+    _require_postgres()
+    for table, rows in rebuild(dry_run).items():
+        total = sum(
+            abs(upcoming - stored_upcoming) + abs(past - stored_past)
+            for _, stored_upcoming, stored_past, upcoming, past in rows)
+        click.echo(f'{table}: {len(rows)} rows drifted by {total} shows'
+                   + (' (not fixed)' if dry_run and rows else '') + '.')
+        for row_id, stored_upcoming, stored_past, upcoming, past in \
+                rows[:examples]:
+            click.echo(f'  {row_id}: upcoming {stored_upcoming} -> '
+                       f'{upcoming}, past {stored_past} -> {past}')
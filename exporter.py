@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+import click
+from flask import (
+    Blueprint, Response, abort, current_app, request, stream_with_context)
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+# Tables are streamed from a server-side cursor and serialized row by row,
+# so exports use the same memory whatever the table size. CSV list columns
+# use the same ';' separator `flask import` reads.
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+LIST_SEPARATOR = ';'
+
+exports = Blueprint('exports', __name__)
+
+
+def export_columns(model):
+    return [
+        column for column in model.__table__.columns
+        if column.name != 'search_vector']
+
+
+def export_rows(model, updated_since=None):
+    # Yields the rows of model as dicts, oldest id first
+    columns = export_columns(model)
+    query = db.session.query(*columns).order_by(model.id)
+    if updated_since is not None:
+        query = query.filter(model.updated_at>updated_since)
+
+    names = [column.name for column in columns]
+    for row in query.yield_per(current_app.config['EXPORT_BATCH_SIZE']):
+        yield dict(zip(names, row))
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def serialize(model, rows, format):
+    # Yields the export as text chunks of about EXPORT_BATCH_SIZE rows
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    buffer = io.StringIO()
+
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(column.name for column in export_columns(model))
+        write = lambda row: writer.writerow(
+            _csv_value(value) for value in row.values())
+    else:
+        write = lambda row: buffer.write(
+            json.dumps(row, default=_json_value) + '\n')
+
+    for count, row in enumerate(rows, start=1):
+        write(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode(chunks, compress=False):
+    # Encodes text chunks to bytes, gzipped on the fly when compress is set
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def parse_updated_since(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+@exports.route('/export/<kind>')
+def export(kind):
+    # Streams a whole table as NDJSON or CSV:
+    # /export/<venues|artists|shows>?format=csv&gzip=1&updated_since=<iso>
+    model = MODELS.get(kind)
+    format = request.args.get('format', 'ndjson')
+    if model is None or format not in FORMATS:
+        abort(404)
+
+    try:
+        updated_since = parse_updated_since(request.args.get('updated_since'))
+    except ValueError:
+        abort(400)
+
+    compress = request.args.get('gzip') == '1'
+    filename = f'{kind}.{format}' + ('.gz' if compress else '')
+    body = encode(
+        serialize(model, export_rows(model, updated_since), format),
+        compress)
+
+    return Response(
+        stream_with_context(body),
+        mimetype='application/gzip' if compress else FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(MODELS)))
+@click.argument('output', type=click.File('wb'))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)),
+              default='ndjson', help='Output format.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--updated-since', help='Only rows updated after this '
+              'ISO 8601 timestamp.')
+@with_appcontext
+def export_command(kind, output, format, compress, updated_since):
+    """Stream venues, artists or shows to a NDJSON or CSV file."""
+    model = MODELS[kind]
+    rows = export_rows(model, parse_updated_since(updated_since))
+    for data in encode(serialize(model, rows, format), compress):
+        output.write(data)
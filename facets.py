@@ -0,0 +1,101 @@
+from flask import request, url_for
+
+from models import db
+from forms import states
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+# The venue and artist listings take ?genre= (repeatable, a row must have
+# every genre given) and ?state=. Genre filters use array containment so
+# they are served by the GIN indexes on genres.
+
+STATES = [state for state, _ in states]
+
+
+def facet_filters():
+    # (genres, state) requested with ?genre=&state=
+    genres = [genre for genre in request.args.getlist('genre') if genre]
+    state = request.args.get('state') or None
+    return genres, state
+
+
+def has_genres(model, genres):
+    # genres is varchar[], the list is bound with that type as Postgres has
+    # no varchar[] @> text[] operator
+    return model.genres.contains(db.cast(genres, model.genres.type))
+
+
+def filter_by_facets(query, model, genres, state):
+    if genres:
+        query = query.filter(has_genres(model, genres))
+    if state:
+        query = query.filter(model.state==state)
+    return query
+
+
+def facet_counts(model, genres, state):
+    # {'genres': {genre: count}, 'states': {state: count}} from a single
+    # GROUPING SETS query. Genre counts honour both filters, state counts
+    # only the genre filter so every other state stays selectable.
+    genre_rows = db.func.unnest(model.genres).alias('genre')
+    genre = db.literal_column('genre', db.String)
+    count = db.func.count(db.distinct(model.id))
+    in_state = count.filter(model.state==state) if state else count
+
+    query = db.session.query(
+        genre, model.state, db.func.grouping(genre), count,
+        in_state).select_from(model).outerjoin(genre_rows, db.true())
+    query = filter_by_facets(query, model, genres, None).group_by(
+        db.func.grouping_sets(db.tuple_(genre), db.tuple_(model.state)))
+
+    counts = {'genres': {}, 'states': {}}
+    for name, row_state, by_state, total, total_in_state in query:
+        if by_state:
+            if row_state:
+                counts['states'][row_state] = total
+        elif name and total_in_state:
+            counts['genres'][name] = total_in_state
+    return counts
+
+
+def _url(genres, state):
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    args['genre'] = genres
+    if state:
+        args['state'] = state
+    else:
+        args.pop('state', None)
+    return url_for(request.endpoint, **args)
+
+
+def facet_links(counts, genres, state):
+    # Sidebar entries, each linking to the listing with that value toggled
+    genre_links = []
+    for name, count in sorted(
+            counts['genres'].items(), key=lambda item: (-item[1], item[0])):
+        selected = name in genres
+        genre_links.append({
+            'name': name,
+            'count': count,
+            'selected': selected,
+            'url': _url(
+                [g for g in genres if g != name] if selected
+                else genres + [name], state),
+        })
+
+    state_links = []
+    for name in STATES:
+        if name not in counts['states']:
+            continue
+        selected = name == state
+        state_links.append({
+            'name': name,
+            'count': counts['states'][name],
+            'selected': selected,
+            'url': _url(genres, None if selected else name),
+        })
+
+    return {'genres': genre_links, 'states': state_links}
@@ -1,9 +1,10 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, NumberRange, Optional
 from wtforms.widgets import TextArea
 import re
+from models import DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
 
 states = [
             ('AL', 'AL'),
@@ -101,6 +102,11 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_DURATION)],
+        default=DEFAULT_SHOW_DURATION
+    )
 
 
 class VenueForm(FlaskForm):
@@ -0,0 +1,219 @@
+import csv
+import math
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Geohash.
+#----------------------------------------------------------------------------#
+
+# Venues store a geohash of their coordinates next to them. Points in the
+# same geohash cell share its prefix, so with a pattern ops btree on the
+# column "every venue in this cell" is an index range scan whatever the
+# table size.
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (
+            (lng_range, longitude) if even else (lat_range, latitude))
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (height, width) of a geohash cell in degrees
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(latitude, longitude, precision):
+    # The cell of the point and its eight neighbours
+    height, width = cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0, height):
+        for dlng in (-width, 0, width):
+            lat = min(90.0, max(-90.0, latitude + dlat))
+            lng = (longitude + dlng + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def covered_radius(latitude, precision):
+    # Distance in km within which covering_cells is sure to hold every point
+    if precision == 0:
+        return math.inf
+    height, width = cell_size(precision)
+    return min(
+        height * KM_PER_DEGREE,
+        width * KM_PER_DEGREE * math.cos(math.radians(latitude)))
+
+
+def distance(lat1, lng1, lat2, lng2):
+    # Great circle distance in km
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+#----------------------------------------------------------------------------#
+# Nearest venues.
+#----------------------------------------------------------------------------#
+
+
+class GeohashBackend:
+    # Searches the 3x3 block of cells around the point, starting with
+    # small cells and moving to coarser ones until the block is known to
+    # hold the nearest venues
+
+    START_PRECISION = 6
+    # Precision 0 would be LIKE '%' over every geocoded venue, past the
+    # 3x3 block of precision 1 cells whatever was found is returned
+    MIN_PRECISION = 1
+
+    def _candidates(self, cells):
+        return db.session.query(
+            Venue.id, Venue.latitude, Venue.longitude).filter(db.or_(*[
+                Venue.geohash.like(cell + '%') for cell in cells])).all()
+
+    def nearest(self, latitude, longitude, limit, radius=None):
+        for precision in range(
+                self.START_PRECISION, self.MIN_PRECISION - 1, -1):
+            covered = covered_radius(latitude, precision)
+            if radius is not None and covered < radius and \
+                    precision > self.MIN_PRECISION:
+                continue
+
+            cells = covering_cells(latitude, longitude, precision)
+            found = sorted(
+                (distance(latitude, longitude, lat, lng), venue_id)
+                for venue_id, lat, lng in self._candidates(cells))
+            if radius is not None:
+                found = [item for item in found if item[0] <= radius]
+            found = found[:limit]
+
+            # Venues further than `covered` may sit outside the block, so
+            # the result only stands when enough venues are nearer
+            if radius is not None or (
+                    len(found) == limit and found[-1][0] <= covered) or \
+                    precision == self.MIN_PRECISION:
+                return [(venue_id, km) for km, venue_id in found]
+        return []
+
+
+backends = {
+    'postgresql': GeohashBackend(),
+}
+
+
+def get_backend():
+    return backends[db.engine.dialect.name]
+
+
+def nearest(latitude, longitude, limit, radius=None):
+    # [(venue id, distance in km)] of the limit venues nearest to the
+    # point, within radius km when given
+    return get_backend().nearest(latitude, longitude, limit, radius)
+
+
+#----------------------------------------------------------------------------#
+# Index maintenance.
+#----------------------------------------------------------------------------#
+
+
+def _set_geohash(mapper, connection, target):
+    if target.latitude is None or target.longitude is None:
+        target.geohash = None
+    else:
+        target.geohash = encode(target.latitude, target.longitude)
+
+
+event.listen(Venue, 'before_insert', _set_geohash)
+event.listen(Venue, 'before_update', _set_geohash)
+
+
+#----------------------------------------------------------------------------#
+# Backfill.
+#----------------------------------------------------------------------------#
+
+
+def read_coordinates(path):
+    # Yields (line number, venue id, latitude, longitude) from a CSV file
+    # with id, latitude and longitude columns, None for malformed rows
+    with open(path, newline='', encoding='utf-8') as source:
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            try:
+                venue_id = int(row['id'])
+                latitude = float(row['latitude'])
+                longitude = float(row['longitude'])
+            except (KeyError, TypeError, ValueError):
+                yield line, None, None, None
+                continue
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                yield line, None, None, None
+                continue
+            yield line, venue_id, latitude, longitude
+
+
+def backfill(rows):
+    # Writes one batch of {'venue_id', 'latitude', 'longitude'} dicts,
+    # geohash included, with a single executemany
+    table = Venue.__table__
+    db.session.execute(
+        table.update().where(table.c.id==db.bindparam('venue_id')),
+        [dict(row, geohash=encode(row['latitude'], row['longitude']))
+         for row in rows])
+    db.session.commit()
+
+
+@click.command('backfill-coordinates')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, help='Rows per UPDATE batch.')
+@with_appcontext
+def backfill_command(path, batch_size):
+    """Set venue coordinates from a CSV file of id,latitude,longitude."""
+    updated = rejected = 0
+    batch = []
+    for line, venue_id, latitude, longitude in read_coordinates(path):
+        if venue_id is None:
+            rejected += 1
+            click.echo(f'Rejected line {line}.', err=True)
+            continue
+        batch.append({
+            'venue_id': venue_id, 'latitude': latitude,
+            'longitude': longitude})
+        if len(batch) >= batch_size:
+            backfill(batch)
+            updated += len(batch)
+            batch = []
+    if batch:
+        backfill(batch)
+        updated += len(batch)
+
+    click.echo(f'Updated {updated} venues, rejected {rejected} rows.')
@@ -0,0 +1,26 @@
+import multiprocessing
+import os
+
+#----------------------------------------------------------------------------#
+# Gunicorn.
+#----------------------------------------------------------------------------#
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Import the app, compile the templates and check the database once in the
+# master, workers inherit all of it when they fork
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Each worker opens its own connections, they can't be shared across
+    # processes
+    from wsgi import app
+    import pooling
+    import replicas
+
+    with app.app_context():
+        for engine in replicas.engines(app).values():
+            engine.dispose()
+            pooling.prefill(engine)
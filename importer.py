@@ -0,0 +1,346 @@
+import csv
+import io
+import json
+import time
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION
+from booking import find_conflicts, lock_bookings, near_boundary
+from forms import VenueForm, ArtistForm, ShowForm
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Rows are validated with the same forms the web pages use, then loaded in
+# batches with COPY on Postgres or executemany anywhere else. Files are read
+# one row at a time, so memory only grows with the batch size.
+#
+# In CSV files list columns (genres) are separated with ';'. Shows reference
+# their venue and artist either by venue_id / artist_id or by
+# venue_name / artist_name.
+
+LIST_SEPARATOR = ';'
+
+
+def read_rows(path, format):
+    # Yields (line number, row dict, None) from a CSV or NDJSON file, or
+    # (line number, None, errors) for a line that can't be parsed
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            for line, row in enumerate(csv.DictReader(source), start=2):
+                if row.get('genres'):
+                    row['genres'] = row['genres'].split(LIST_SEPARATOR)
+                yield line, row, None
+        else:
+            for line, text in enumerate(source, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError as e:
+                    yield line, None, {'row': [f'Invalid JSON: {e}']}
+                    continue
+                if not isinstance(row, dict):
+                    yield line, None, {'row': ['Not a JSON object.']}
+                    continue
+                yield line, row, None
+
+
+def _formdata(row):
+    items = []
+    for key, value in row.items():
+        if value is None:
+            continue
+        if isinstance(value, list):
+            items.extend((key, str(item)) for item in value)
+        else:
+            items.append((key, str(value)))
+    return MultiDict(items)
+
+
+def validate(form_class, row):
+    # Returns the validated form, or the errors when the row is rejected
+    form = form_class(formdata=_formdata(row), meta={'csrf': False})
+    try:
+        if form.validate():
+            return form, None
+        return None, form.errors
+    except (TypeError, ValueError) as e:
+        return None, {'row': [str(e)]}
+
+
+def venue_row(form):
+    return {
+        'name': form.name.data,
+        'genres': form.genres.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'website': form.website.data,
+        'seeking_talent': form.seeking_talent.data == 'True',
+        'seeking_description': form.seeking_description.data,
+    }
+
+
+def artist_row(form):
+    return {
+        'name': form.name.data,
+        'genres': form.genres.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'website': form.website.data,
+        'facebook_link': form.facebook_link.data,
+        'seeking_venue': form.seeking_venue.data == 'True',
+        'seeking_description': form.seeking_description.data,
+        'image_link': form.image_link.data,
+    }
+
+
+#----------------------------------------------------------------------------#
+# Foreign keys.
+#----------------------------------------------------------------------------#
+
+
+def _id(value):
+    value = str(value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def _resolve(model, rows, id_key, name_key):
+    # Maps the ids and names referenced by a batch to existing ids with one
+    # query per kind of reference
+    ids, names = set(), set()
+    for row in rows:
+        if _id(row.get(id_key)) is not None:
+            ids.add(_id(row[id_key]))
+        elif row.get(name_key):
+            names.add(row[name_key])
+
+    by_id, by_name = set(), {}
+    if ids:
+        by_id = {row.id for row in db.session.query(model.id).filter(
+            model.id.in_(ids))}
+    if names:
+        by_name = {row.name: row.id for row in db.session.query(
+            model.id, model.name).filter(model.name.in_(names))}
+    return by_id, by_name
+
+
+def _lookup(row, id_key, name_key, by_id, by_name):
+    value = _id(row.get(id_key))
+    if value is not None:
+        return value if value in by_id else None
+    return by_name.get(row.get(name_key))
+
+
+def resolve_shows(batch):
+    # Fills in venue_id / artist_id for a batch of (line, row) pairs and
+    # returns the rows that reference unknown entities
+    rows = [row for _, row in batch]
+    venues = _resolve(Venue, rows, 'venue_id', 'venue_name')
+    artists = _resolve(Artist, rows, 'artist_id', 'artist_name')
+
+    resolved, rejected = [], []
+    for line, row in batch:
+        venue_id = _lookup(row, 'venue_id', 'venue_name', *venues)
+        artist_id = _lookup(row, 'artist_id', 'artist_name', *artists)
+        if venue_id is None or artist_id is None:
+            rejected.append((line, {'row': ['Unknown venue or artist.']}))
+            continue
+        row['venue_id'] = venue_id
+        row['artist_id'] = artist_id
+        resolved.append((line, row))
+    return resolved, rejected
+
+
+def reject_conflicts(batch):
+    # Drops shows that overlap an existing show or an earlier show of the
+    # batch, one of them would fail the whole COPY
+    if db.engine.dialect.name != 'postgresql':
+        return batch, []
+
+    proposals = [{
+        'venue_id': row['venue_id'],
+        'artist_id': row['artist_id'],
+        'start_time': row['show_time'],
+        'duration': row['duration'],
+    } for _, row in batch]
+    # The constraints can't see across partitions, so shows near a new year
+    # are checked under the same locks as the web form's. load commits the
+    # batch in this transaction, releasing them.
+    lock_bookings([
+        proposal for proposal in proposals if near_boundary(proposal)])
+
+    kept, rejected, accepted = [], [], set()
+    for index, ((line, row), conflicts) in enumerate(
+            zip(batch, find_conflicts(proposals))):
+        if any('show_id' in conflict or conflict['proposal'] in accepted
+               for conflict in conflicts):
+            rejected.append((line, {'row': [
+                'Overlaps another show of the venue or artist.']}))
+            continue
+        accepted.add(index)
+        kept.append((line, row))
+    return kept, rejected
+
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+
+# COPY reads this unquoted field as NULL. Every other value is quoted, so
+# empty strings (and a literal \N) stay strings as with executemany.
+COPY_NULL = '\\N'
+
+
+def _copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, list):
+        # Postgres array literal
+        items = (
+            '"%s"' % item.replace('\\', '\\\\').replace('"', '\\"')
+            for item in value)
+        value = '{%s}' % ','.join(items)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    return '"%s"' % str(value).replace('"', '""')
+
+
+def copy_rows(model, rows):
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(
+            _copy_value(row[column]) for column in columns) + '\n')
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY "%s" (%s) FROM STDIN WITH (FORMAT csv, NULL \'%s\')' % (
+            model.__tablename__, ', '.join(columns), COPY_NULL),
+        buffer)
+
+
+def insert_rows(model, rows):
+    db.session.execute(model.__table__.insert(), rows)
+
+
+def load(model, rows, use_copy):
+    if not rows:
+        return
+    if use_copy:
+        copy_rows(model, rows)
+    else:
+        insert_rows(model, rows)
+    db.session.commit()
+
+
+KINDS = {
+    'venues': (Venue, VenueForm, venue_row),
+    'artists': (Artist, ArtistForm, artist_row),
+    'shows': (Show, ShowForm, None),
+}
+
+
+def import_file(kind, path, format, batch_size, use_copy, on_reject):
+    # Streams path into the table for kind, returns (loaded, rejected)
+    model, form_class, to_row = KINDS[kind]
+    loaded = rejected = 0
+
+    def flush(batch):
+        nonlocal loaded, rejected
+        if kind == 'shows':
+            batch, failures = resolve_shows(batch)
+            batch, conflicts = reject_conflicts(batch)
+            failures += conflicts
+            for line, errors in failures:
+                on_reject(line, errors)
+            rejected += len(failures)
+            rows = [{
+                'venue_id': row['venue_id'],
+                'artist_id': row['artist_id'],
+                'show_time': row['show_time'],
+                'duration': row['duration'],
+            } for _, row in batch]
+        else:
+            rows = [row for _, row in batch]
+        load(model, rows, use_copy)
+        loaded += len(rows)
+
+    batch = []
+    for line, row, errors in read_rows(path, format):
+        if errors is None and kind == 'shows':
+            # References by name satisfy the form, they're resolved later
+            form, errors = validate(form_class, dict(
+                row,
+                venue_id=row.get('venue_id') or row.get('venue_name'),
+                artist_id=row.get('artist_id') or row.get('artist_name')))
+        elif errors is None:
+            form, errors = validate(form_class, row)
+        if errors:
+            rejected += 1
+            on_reject(line, errors)
+            continue
+
+        if to_row is None:
+            row['show_time'] = form.start_time.data
+            row['duration'] = form.duration.data or DEFAULT_SHOW_DURATION
+            batch.append((line, row))
+        else:
+            batch.append((line, to_row(form)))
+
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    return loaded, rejected
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='File format, guessed from the extension by default.')
+@click.option('--batch-size', default=10000, help='Rows per COPY / insert.')
+@click.option('--no-copy', is_flag=True,
+              help='Use executemany even on Postgres.')
+@click.option('--rejects', type=click.Path(dir_okay=False),
+              help='Write rejected rows as NDJSON to this file.')
+@with_appcontext
+def import_command(kind, path, format, batch_size, no_copy, rejects):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file."""
+    format = format or ('csv' if path.endswith('.csv') else 'ndjson')
+    use_copy = not no_copy and db.engine.dialect.name == 'postgresql'
+    rejects_file = open(rejects, 'w') if rejects else None
+
+    def on_reject(line, errors):
+        if rejects_file:
+            rejects_file.write(
+                json.dumps({'line': line, 'errors': errors}) + '\n')
+        else:
+            click.echo(f'Rejected line {line}: {errors}', err=True)
+
+    started = time.perf_counter()
+    try:
+        loaded, rejected = import_file(
+            kind, path, format, batch_size, use_copy, on_reject)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    elapsed = time.perf_counter() - started
+
+    click.echo(
+        f'Loaded {loaded} {kind}, rejected {rejected} in {elapsed:.1f}s '
+        f'({loaded / elapsed if elapsed else 0:.0f} rows/s, '
+        f'{"COPY" if use_copy else "executemany"}).')
@@ -0,0 +1,99 @@
+from flask import current_app
+
+from cache import fragment_key
+from models import db
+
+#----------------------------------------------------------------------------#
+# Listing rows.
+#----------------------------------------------------------------------------#
+
+# The listing pages only read a few columns per row. With
+# LISTING_QUERY_MODE = 'core' their queries are still built with the ORM
+# but executed through Core, so rows come back as plain result tuples
+# without the ORM loading step. Either way they are turned into the
+# __slots__ objects below rather than dicts.
+
+
+class Row:
+    __slots__ = ()
+
+    def __getitem__(self, name):
+        # Lets the rows stand in for the dicts the listings used to build
+        return getattr(self, name)
+
+
+class VenueRow(Row):
+    __slots__ = (
+        'id', 'name', 'city', 'state', 'num_upcoming_shows', 'fragment_key')
+
+    def __init__(self, id, name, city, state, version, num_upcoming_shows):
+        self.id = id
+        self.name = name
+        self.city = city
+        self.state = state
+        self.num_upcoming_shows = num_upcoming_shows
+        self.fragment_key = fragment_key('venue', id, version)
+
+
+class ArtistRow(Row):
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class ShowRow(Row):
+    __slots__ = (
+        'venue_id', 'venue_name', 'artist_id', 'artist_name',
+        'artist_image_link', 'start_time', 'fragment_key')
+
+    def __init__(self, id, show_time, venue_id, venue_name, artist_id,
+                 artist_name, artist_image_link, version, venue_version,
+                 artist_version):
+        self.venue_id = venue_id
+        self.venue_name = venue_name
+        self.artist_id = artist_id
+        self.artist_name = artist_name
+        self.artist_image_link = artist_image_link
+        self.start_time = show_time
+        self.fragment_key = fragment_key(
+            'show', id, version, venue_version, artist_version)
+
+
+#----------------------------------------------------------------------------#
+# Core queries.
+#----------------------------------------------------------------------------#
+
+
+class CoreQuery:
+    # Read-only stand-in for a column Query: limit() and yield_per() build
+    # on the wrapped Query, iterating executes its Core statement directly
+
+    def __init__(self, query, batch_size=None):
+        self.query = query
+        self.batch_size = batch_size
+
+    def limit(self, limit):
+        return CoreQuery(self.query.limit(limit), self.batch_size)
+
+    def yield_per(self, count):
+        return CoreQuery(self.query, count)
+
+    def __iter__(self):
+        # Keeps options set on the wrapped Query, such as its yield_per
+        statement = self.query.statement.execution_options(
+            **self.query._execution_options)
+        if self.batch_size:
+            statement = statement.execution_options(
+                stream_results=True, max_row_buffer=self.batch_size)
+        return iter(db.session.execute(statement))
+
+    def all(self):
+        return list(self)
+
+
+def listing_query(query, mode=None):
+    # The query to iterate for a listing, per LISTING_QUERY_MODE
+    mode = mode or current_app.config['LISTING_QUERY_MODE']
+    return CoreQuery(query) if mode == 'core' else query
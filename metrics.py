@@ -0,0 +1,229 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class Histogram:
+    # Cumulative histogram rendered in the Prometheus text format
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+# name: (help, buckets, per request stat)
+REQUEST_HISTOGRAMS = {
+    'fyyur_request_duration_seconds': (
+        'Time spent handling the request.', TIME_BUCKETS, 'duration'),
+    'fyyur_request_db_statements': (
+        'SQL statements executed per request.', COUNT_BUCKETS, 'statements'),
+    'fyyur_request_db_time_seconds': (
+        'Time spent in SQL statements per request.', TIME_BUCKETS, 'db_time'),
+    'fyyur_request_db_rows': (
+        'Rows returned by SQL statements per request.', ROW_BUCKETS, 'rows'),
+    'fyyur_request_slowest_statement_seconds': (
+        'Slowest SQL statement per request.', TIME_BUCKETS, 'slowest'),
+}
+
+
+class RequestStats:
+    # SQL activity of a single request
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0
+        self.rows = 0
+        self.slowest = 0
+        self.slowest_statement = None
+
+    def record(self, statement, elapsed):
+        self.statements += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement
+
+    def merge(self, other):
+        # Adds the statements another thread ran for this request
+        self.statements += other.statements
+        self.db_time += other.db_time
+        self.rows += other.rows
+        if other.slowest > self.slowest:
+            self.slowest = other.slowest
+            self.slowest_statement = other.slowest_statement
+
+
+# Stats handed to a thread working for a request by track()
+_thread = threading.local()
+
+
+def current_stats():
+    # RequestStats the statements of this thread count towards, if any
+    if has_request_context():
+        return g.get('request_stats')
+    return getattr(_thread, 'stats', None)
+
+
+@contextmanager
+def track(stats):
+    # Counts the statements run by this thread, outside the request
+    # context, in stats. The request merges them in afterwards.
+    _thread.stats = stats
+    try:
+        yield
+    finally:
+        _thread.stats = None
+
+
+class CountingCursor:
+    # DBAPI cursor proxy adding the rows fetched through it to a request's
+    # stats. cursor.rowcount can't be used: it is -1 for SQLite selects and
+    # server-side cursors, and the affected rows for DML.
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Metrics:
+    # Records per request SQL statistics through engine events and
+    # aggregates them into per endpoint histograms
+
+    def __init__(self, app=None):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+
+        # Listening on the Engine class covers every engine the app creates
+        if not event.contains(
+                Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    def _start_request(self):
+        g.request_stats = RequestStats()
+
+    def _finish_request(self, exception=None):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return
+        stats.duration = time.perf_counter() - stats.started
+
+        endpoint = request.endpoint or 'none'
+        with self._lock:
+            histograms = self.histograms.get(endpoint)
+            if histograms is None:
+                histograms = self.histograms[endpoint] = {
+                    name: Histogram(buckets)
+                    for name, (_, buckets, _) in REQUEST_HISTOGRAMS.items()}
+            for name, (_, _, attribute) in REQUEST_HISTOGRAMS.items():
+                histograms[name].observe(getattr(stats, attribute))
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault('query_start_time', []).append(
+            time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+
+        stats = current_stats()
+        if stats is not None:
+            stats.record(statement, elapsed)
+            # The result reads rows from context.cursor, which is only set
+            # up after this event
+            if context is not None:
+                context.cursor = CountingCursor(context.cursor, stats)
+
+        if not has_app_context():
+            return
+        if elapsed >= current_app.config['SLOW_QUERY_THRESHOLD']:
+            current_app.logger.warning(
+                'Slow query (%.3fs) on %s: %s', elapsed,
+                request.endpoint if has_request_context() else None,
+                statement)
+
+    def render(self, extra=()):
+        # Prometheus text exposition of every endpoint seen so far, plus
+        # extra (name, type, help, value) samples
+        lines = []
+        with self._lock:
+            for name, (help, _, _) in REQUEST_HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histograms in sorted(self.histograms.items()):
+                    lines.extend(histograms[name].lines(
+                        name, f'endpoint="{endpoint}"'))
+
+        for name, type, help, value in extra:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {type}')
+            # A dict holds one value per label set
+            if isinstance(value, dict):
+                lines.extend(
+                    f'{name}{{{labels}}} {sample}'
+                    for labels, sample in value.items())
+            else:
+                lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,38 @@
+"""genre gin indexes
+
+Revision ID: 0b9d6e2f4a18
+Revises: f1c08a6d3e57
+Create Date: 2026-10-18 18:12:09.637211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b9d6e2f4a18'
+down_revision = 'f1c08a6d3e57'
+branch_labels = None
+depends_on = None
+
+
+# Serve genres @> ARRAY[...] filters on the venue and artist listings.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_venue_genres', 'Venue', ['genres'],
+            postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index(
+            'ix_artist_genres', 'Artist', ['genres'],
+            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_artist_genres', table_name='Artist',
+            postgresql_concurrently=True)
+        op.drop_index(
+            'ix_venue_genres', table_name='Venue',
+            postgresql_concurrently=True)
@@ -0,0 +1,83 @@
+"""search vectors and trigram indexes
+
+Revision ID: 3b8e5f0c9a21
+Revises: 61fd916f05e3
+Create Date: 2026-10-18 10:12:41.503317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e5f0c9a21'
+down_revision = '61fd916f05e3'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # array_to_string() is only STABLE, so wrap it to make genres indexable
+    op.execute("""
+        CREATE OR REPLACE FUNCTION genres_text(varchar[]) RETURNS text
+        LANGUAGE sql IMMUTABLE AS $$ SELECT array_to_string($1, ' ') $$
+    """)
+
+    for table in TABLES:
+        name = table.lower()
+        op.add_column(table, sa.Column(
+            'search_vector', postgresql.TSVECTOR(), nullable=True))
+
+        op.execute(f"""
+            CREATE FUNCTION {name}_search_vector_update() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.city, '')), 'B') ||
+                    setweight(to_tsvector('simple', coalesce(genres_text(NEW.genres), '')), 'C');
+                RETURN NEW;
+            END
+            $$
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {name}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF name, city, genres ON "{table}"
+            FOR EACH ROW EXECUTE PROCEDURE {name}_search_vector_update()
+        """)
+
+        # Backfill existing rows through the trigger
+        op.execute(f'UPDATE "{table}" SET name = name')
+
+        op.create_index(
+            f'ix_{name}_search_vector', table, ['search_vector'],
+            postgresql_using='gin')
+        op.execute(
+            f'CREATE INDEX ix_{name}_name_trgm ON "{table}" '
+            f'USING gin (name gin_trgm_ops)')
+        op.execute(
+            f'CREATE INDEX ix_{name}_city_trgm ON "{table}" '
+            f'USING gin (city gin_trgm_ops)')
+        op.execute(
+            f'CREATE INDEX ix_{name}_genres_trgm ON "{table}" '
+            f'USING gin (genres_text(genres) gin_trgm_ops)')
+
+
+def downgrade():
+    for table in TABLES:
+        name = table.lower()
+        op.drop_index(f'ix_{name}_genres_trgm', table_name=table)
+        op.drop_index(f'ix_{name}_city_trgm', table_name=table)
+        op.drop_index(f'ix_{name}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{name}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER {name}_search_vector_trigger ON "{table}"')
+        op.execute(f'DROP FUNCTION {name}_search_vector_update()')
+        op.drop_column(table, 'search_vector')
+
+    op.execute('DROP FUNCTION genres_text(varchar[])')
@@ -0,0 +1,45 @@
+"""show booking constraints
+
+Revision ID: 5c2f8b7e1a94
+Revises: 7a3e5c1d9f60
+Create Date: 2026-10-18 20:15:06.552318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2f8b7e1a94'
+down_revision = '7a3e5c1d9f60'
+branch_labels = None
+depends_on = None
+
+
+# btree_gist provides the GiST "=" on integers, so one index covers both
+# the venue (or artist) id and the time range. Exclusion constraints can't
+# be added NOT VALID: overlapping shows already in the table must be moved
+# or removed first, `booking.find_conflicts` lists them.
+
+CONSTRAINTS = (
+    ('ex_show_venue_overlap', 'venue_id'),
+    ('ex_show_artist_overlap', 'artist_id'),
+)
+
+
+def upgrade():
+    op.add_column('Show', sa.Column(
+        'duration', sa.Integer(), server_default='120', nullable=False))
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in CONSTRAINTS:
+        op.execute(
+            f'ALTER TABLE "Show" ADD CONSTRAINT {name} EXCLUDE USING gist '
+            f'({column} WITH =, tsrange(show_time, show_time + duration * '
+            f"interval '1 minute') WITH &&) WHERE (show_time IS NOT NULL)")
+
+
+def downgrade():
+    for name, _ in CONSTRAINTS:
+        op.drop_constraint(name, 'Show')
+    op.drop_column('Show', 'duration')
@@ -0,0 +1,41 @@
+"""venue coordinates
+
+Revision ID: 7a3e5c1d9f60
+Revises: 0b9d6e2f4a18
+Create Date: 2026-10-18 19:03:51.770142
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3e5c1d9f60'
+down_revision = '0b9d6e2f4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geohash', sa.String(12), nullable=True))
+
+    # varchar_pattern_ops lets LIKE 'prefix%' use the index whatever the
+    # database collation
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_venue_geohash', 'Venue', ['geohash'],
+            postgresql_ops={'geohash': 'varchar_pattern_ops'},
+            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_venue_geohash', table_name='Venue',
+            postgresql_concurrently=True)
+
+    op.drop_column('Venue', 'geohash')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
@@ -0,0 +1,51 @@
+"""show and venue indexes
+
+Revision ID: 8d41c7b2e6f3
+Revises: 3b8e5f0c9a21
+Create Date: 2026-10-18 11:05:17.284905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c7b2e6f3'
+down_revision = '3b8e5f0c9a21'
+branch_labels = None
+depends_on = None
+
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so every
+# statement runs in autocommit mode and the tables stay writable meanwhile.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_show_venue_id_show_time', 'Show', ['venue_id', 'show_time'],
+            postgresql_concurrently=True)
+        op.create_index(
+            'ix_show_artist_id_show_time', 'Show', ['artist_id', 'show_time'],
+            postgresql_concurrently=True)
+        op.create_index(
+            'ix_show_show_time_brin', 'Show', ['show_time'],
+            postgresql_using='brin', postgresql_concurrently=True)
+        op.create_index(
+            'ix_venue_city_state', 'Venue', ['city', 'state'],
+            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_venue_city_state', table_name='Venue',
+            postgresql_concurrently=True)
+        op.drop_index(
+            'ix_show_show_time_brin', table_name='Show',
+            postgresql_concurrently=True)
+        op.drop_index(
+            'ix_show_artist_id_show_time', table_name='Show',
+            postgresql_concurrently=True)
+        op.drop_index(
+            'ix_show_venue_id_show_time', table_name='Show',
+            postgresql_concurrently=True)
@@ -0,0 +1,103 @@
+"""show counters
+
+Revision ID: a83d2f6c1b07
+Revises: 5c2f8b7e1a94
+Create Date: 2026-10-18 21:02:37.918406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83d2f6c1b07'
+down_revision = '5c2f8b7e1a94'
+branch_labels = None
+depends_on = None
+
+
+TABLES = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+
+def _apply(row, sign):
+    # Adds (sign 1) or removes (sign -1) OLD or NEW from its venue and
+    # artist counters
+    return '\n'.join(f"""
+                UPDATE "{table}" SET
+                    upcoming_show_count = upcoming_show_count
+                        {sign} ({row}.show_time > rolled)::int,
+                    past_show_count = past_show_count
+                        {sign} ({row}.show_time <= rolled)::int
+                WHERE id = {row}.{column};""" for table, column in TABLES)
+
+
+def upgrade():
+    for table, _ in TABLES:
+        op.add_column(table, sa.Column(
+            'upcoming_show_count', sa.Integer(), server_default='0',
+            nullable=False))
+        op.add_column(table, sa.Column(
+            'past_show_count', sa.Integer(), server_default='0',
+            nullable=False))
+
+    # Single row, shows after rolled_at count as upcoming
+    op.execute("""
+        CREATE TABLE show_counter_state (
+            id boolean PRIMARY KEY DEFAULT true CHECK (id),
+            rolled_at timestamp NOT NULL
+        )
+    """)
+    op.execute(
+        'INSERT INTO show_counter_state (rolled_at) VALUES (localtimestamp)')
+
+    # FOR SHARE waits for a roll-over in progress, which locks the row
+    op.execute(f"""
+        CREATE FUNCTION show_counters_update() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            rolled timestamp;
+        BEGIN
+            SELECT rolled_at INTO rolled FROM show_counter_state FOR SHARE;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.show_time IS NOT NULL THEN
+                {_apply('OLD', '-')}
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.show_time IS NOT NULL THEN
+                {_apply('NEW', '+')}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER show_counters_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF venue_id, artist_id, show_time
+        ON "Show"
+        FOR EACH ROW EXECUTE PROCEDURE show_counters_update()
+    """)
+
+    # Backfill as of rolled_at
+    for table, column in TABLES:
+        op.execute(f"""
+            UPDATE "{table}" t SET
+                upcoming_show_count = c.upcoming,
+                past_show_count = c.past
+            FROM (
+                SELECT s.{column} AS id,
+                    count(*) FILTER (WHERE s.show_time > r.rolled_at)
+                        AS upcoming,
+                    count(*) FILTER (WHERE s.show_time <= r.rolled_at)
+                        AS past
+                FROM "Show" s, show_counter_state r
+                GROUP BY s.{column}
+            ) c
+            WHERE t.id = c.id
+        """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER show_counters_trigger ON "Show"')
+    op.execute('DROP FUNCTION show_counters_update()')
+    op.execute('DROP TABLE show_counter_state')
+    for table, _ in TABLES:
+        op.drop_column(table, 'past_show_count')
+        op.drop_column(table, 'upcoming_show_count')
@@ -0,0 +1,48 @@
+"""show deletes
+
+Revision ID: b7f29c4e8d13
+Revises: c6e19a4d2b75
+Create Date: 2026-10-19 09:12:44.207519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f29c4e8d13'
+down_revision = 'c6e19a4d2b75'
+branch_labels = None
+depends_on = None
+
+
+# The /shows ETag reads max(id) and max(updated_at) of Show from their
+# indexes, which see inserts and edits but not deletes. show_deletes counts
+# the DELETE statements on Show, once per statement however many rows it
+# removes, so deletes don't queue on the state row one show at a time.
+
+
+def upgrade():
+    op.add_column('show_counter_state', sa.Column(
+        'show_deletes', sa.BigInteger(), server_default='0',
+        nullable=False))
+    op.execute("""
+        CREATE FUNCTION show_deletes_update() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE show_counter_state SET show_deletes = show_deletes + 1;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER show_deletes_trigger
+        AFTER DELETE ON "Show"
+        FOR EACH STATEMENT EXECUTE PROCEDURE show_deletes_update()
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER show_deletes_trigger ON "Show"')
+    op.execute('DROP FUNCTION show_deletes_update()')
+    op.drop_column('show_counter_state', 'show_deletes')
@@ -0,0 +1,44 @@
+"""updated_at columns
+
+Revision ID: c52a9e17d4b8
+Revises: 8d41c7b2e6f3
+Create Date: 2026-10-18 14:31:52.910244
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52a9e17d4b8'
+down_revision = '8d41c7b2e6f3'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    # now() is stable, so Postgres 11+ adds the column without a rewrite
+    for table in TABLES:
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), server_default=sa.func.now(),
+            nullable=True))
+
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f'ix_{table.lower()}_updated_at', table, ['updated_at'],
+                postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(
+                f'ix_{table.lower()}_updated_at', table_name=table,
+                postgresql_concurrently=True)
+
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
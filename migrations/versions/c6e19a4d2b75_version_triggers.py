@@ -0,0 +1,56 @@
+"""version triggers
+
+Revision ID: c6e19a4d2b75
+Revises: d27b9e4f8c31
+Create Date: 2026-10-18 22:41:09.573018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e19a4d2b75'
+down_revision = 'd27b9e4f8c31'
+branch_labels = None
+depends_on = None
+
+
+# version keys the template fragment cache. It was bumped by the ORM as a
+# version_id_col, which also made it an optimistic lock and missed Core
+# updates (imports, the geohash backfill). A trigger now bumps it on any
+# update changing the row, ignoring the columns maintained by the database
+# itself. Row triggers on the partitioned "Show" need PostgreSQL 13.
+
+TABLES = ('Venue', 'Artist', 'Show')
+IGNORED = ('version', 'updated_at', 'search_vector', 'upcoming_show_count',
+           'past_show_count')
+
+
+def upgrade():
+    ignored = ', '.join(f"'{column}'" for column in IGNORED)
+    op.execute(f"""
+        CREATE FUNCTION bump_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF to_jsonb(NEW) - ARRAY[{ignored}]
+                    IS DISTINCT FROM to_jsonb(OLD) - ARRAY[{ignored}] THEN
+                NEW.version := OLD.version + 1;
+            END IF;
+            RETURN NEW;
+        END
+        $$
+    """)
+    for table in TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table.lower()}_version_trigger
+            BEFORE UPDATE ON "{table}"
+            FOR EACH ROW EXECUTE PROCEDURE bump_version()
+        """)
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(
+            f'DROP TRIGGER {table.lower()}_version_trigger ON "{table}"')
+    op.execute('DROP FUNCTION bump_version()')
@@ -0,0 +1,161 @@
+"""show partitions
+
+Revision ID: d27b9e4f8c31
+Revises: a83d2f6c1b07
+Create Date: 2026-10-18 21:48:10.264519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27b9e4f8c31'
+down_revision = 'a83d2f6c1b07'
+branch_labels = None
+depends_on = None
+
+
+# Rebuilds "Show" as a table range partitioned by year on show_time, with
+# a "Show_default" partition catching rows no yearly partition takes.
+# show_create_partition(year) adds a year, moving its rows out of the
+# default partition, and is what `flask show-partitions create` calls.
+#
+# Postgres requires the partition key in the primary key, so it becomes
+# (id, show_time) and show_time NOT NULL. Exclusion constraints can't span
+# partitions either: each partition gets its own, so shows overlapping a
+# new year's boundary are not caught by them. The web form
+# (booking.boundary_conflict) and the importer check those shows under
+# advisory locks on the venue and the artist.
+#
+# The table is copied, so it is locked for the whole migration.
+
+INDEXES = (
+    ('ix_show_venue_id_show_time', ['venue_id', 'show_time'], {}),
+    ('ix_show_artist_id_show_time', ['artist_id', 'show_time'], {}),
+    ('ix_show_show_time_brin', ['show_time'], {'postgresql_using': 'brin'}),
+    ('ix_show_show_time_venue_id_artist_id',
+        ['show_time', 'venue_id', 'artist_id'], {}),
+    ('ix_show_updated_at', ['updated_at'], {}),
+)
+OVERLAPS = (('venue_overlap', 'venue_id'), ('artist_overlap', 'artist_id'))
+SHOW_RANGE = "tsrange(show_time, show_time + duration * interval '1 minute')"
+
+
+def _exclusion_sql(table, prefix, where=''):
+    return [
+        f'ALTER TABLE "{table}" ADD CONSTRAINT {prefix}_{name} '
+        f'EXCLUDE USING gist ({column} WITH =, {SHOW_RANGE} WITH &&){where}'
+        for name, column in OVERLAPS]
+
+
+def _finish_table(primary_key):
+    # Keys, indexes, sequence and counters trigger of a rebuilt "Show"
+    op.create_primary_key('Show_pkey', 'Show', primary_key)
+    op.create_foreign_key(
+        'Show_venue_id_fkey', 'Show', 'Venue', ['venue_id'], ['id'])
+    op.create_foreign_key(
+        'Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'])
+    for name, columns, options in INDEXES:
+        op.create_index(name, 'Show', columns, **options)
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute("""
+        CREATE TRIGGER show_counters_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF venue_id, artist_id, show_time
+        ON "Show"
+        FOR EACH ROW EXECUTE PROCEDURE show_counters_update()
+    """)
+
+
+def upgrade():
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM "Show" WHERE show_time IS NULL) THEN
+                RAISE EXCEPTION 'Shows without show_time can''t be '
+                    'partitioned, set or delete them first';
+            END IF;
+        END
+        $$
+    """)
+
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.rename_table('Show', 'Show_unpartitioned')
+    op.execute("""
+        CREATE TABLE "Show" (LIKE "Show_unpartitioned" INCLUDING DEFAULTS)
+        PARTITION BY RANGE (show_time)
+    """)
+    op.alter_column('Show', 'show_time', nullable=False)
+
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+    for sql in _exclusion_sql('Show_default', 'ex_show_default'):
+        op.execute(sql)
+
+    show_range = SHOW_RANGE.replace("'", "''")
+    exclusions = ''.join(f"""
+            EXECUTE format(
+                'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                '({column} WITH =, {show_range} WITH &&)',
+                partition_name, 'ex_show_' || year || '_{name}');"""
+        for name, column in OVERLAPS)
+    op.execute(f"""
+        CREATE FUNCTION show_create_partition(year integer) RETURNS boolean
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            partition_name text := 'Show_' || year;
+            starts timestamp := make_timestamp(year, 1, 1, 0, 0, 0);
+            ends timestamp := make_timestamp(year + 1, 1, 1, 0, 0, 0);
+        BEGIN
+            IF to_regclass(quote_ident(partition_name)) IS NOT NULL THEN
+                RETURN false;
+            END IF;
+
+            -- The new range must not be in the default partition
+            CREATE TEMP TABLE show_partition_rows AS
+                SELECT * FROM "Show_default"
+                WHERE show_time >= starts AND show_time < ends;
+            DELETE FROM "Show_default"
+                WHERE show_time >= starts AND show_time < ends;
+
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF "Show" '
+                'FOR VALUES FROM (%L) TO (%L)',
+                partition_name, starts, ends);{exclusions}
+
+            INSERT INTO "Show" SELECT * FROM show_partition_rows;
+            DROP TABLE show_partition_rows;
+            RETURN true;
+        END
+        $$
+    """)
+
+    # Every year with shows, up to two years ahead
+    op.execute("""
+        SELECT show_create_partition(year)
+        FROM generate_series(
+            (SELECT coalesce(min(extract(year FROM show_time)),
+                             extract(year FROM localtimestamp))::integer
+             FROM "Show_unpartitioned"),
+            extract(year FROM localtimestamp)::integer + 2) AS year
+    """)
+
+    op.execute('INSERT INTO "Show" SELECT * FROM "Show_unpartitioned"')
+    op.drop_table('Show_unpartitioned')
+    _finish_table(['id', 'show_time'])
+
+
+def downgrade():
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.rename_table('Show', 'Show_partitioned')
+    op.execute("""
+        CREATE TABLE "Show" (LIKE "Show_partitioned" INCLUDING DEFAULTS)
+    """)
+    op.alter_column('Show', 'show_time', nullable=True)
+    op.execute('INSERT INTO "Show" SELECT * FROM "Show_partitioned"')
+    op.execute('DROP TABLE "Show_partitioned" CASCADE')
+    op.execute('DROP FUNCTION show_create_partition(integer)')
+
+    for sql in _exclusion_sql(
+            'Show', 'ex_show', ' WHERE (show_time IS NOT NULL)'):
+        op.execute(sql)
+    _finish_table(['id'])
@@ -0,0 +1,31 @@
+"""version columns
+
+Revision ID: e4a71c3b9d52
+Revises: c52a9e17d4b8
+Create Date: 2026-10-18 16:02:37.418820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a71c3b9d52'
+down_revision = 'c52a9e17d4b8'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    # A constant default, so Postgres 11+ adds the column without a rewrite
+    for table in TABLES:
+        op.add_column(table, sa.Column(
+            'version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'version')
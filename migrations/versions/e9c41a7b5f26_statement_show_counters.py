@@ -0,0 +1,127 @@
+"""statement show counters
+
+Revision ID: e9c41a7b5f26
+Revises: b7f29c4e8d13
+Create Date: 2026-10-19 10:03:17.448126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c41a7b5f26'
+down_revision = 'b7f29c4e8d13'
+branch_labels = None
+depends_on = None
+
+
+# The show counters were kept by a row trigger: every show of a COPY import
+# or `flask seed` ran two UPDATEs and locked the state row on its own.
+# Statement triggers now read the changed shows from transition tables and
+# apply them with one grouped UPDATE per table. Transition tables don't
+# allow a column list, so every UPDATE of Show fires the trigger, and rows
+# whose counters don't move are left alone.
+
+TABLES = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+EVENTS = ('insert', 'update', 'delete')
+
+
+def _apply(changes):
+    # One UPDATE per table adding changes, a UNION ALL of (venue_id,
+    # artist_id, show_time, sign) rows
+    return '\n'.join(f"""
+                UPDATE "{table}" t SET
+                    upcoming_show_count = t.upcoming_show_count + c.upcoming,
+                    past_show_count = t.past_show_count + c.past
+                FROM (
+                    SELECT {column} AS id,
+                        coalesce(sum(sign) FILTER (
+                            WHERE show_time > rolled), 0) AS upcoming,
+                        coalesce(sum(sign) FILTER (
+                            WHERE show_time <= rolled), 0) AS past
+                    FROM ({changes}) changes
+                    WHERE show_time IS NOT NULL
+                    GROUP BY {column}
+                ) c
+                WHERE t.id = c.id AND (c.upcoming, c.past) <> (0, 0);"""
+        for table, column in TABLES)
+
+
+def _rows(table, sign):
+    return (f'SELECT venue_id, artist_id, show_time, {sign} AS sign '
+            f'FROM {table}')
+
+
+def upgrade():
+    # FOR SHARE waits for a roll-over in progress, which locks the row
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION show_counters_update() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            rolled timestamp;
+        BEGIN
+            SELECT rolled_at INTO rolled FROM show_counter_state FOR SHARE;
+            IF TG_OP = 'INSERT' THEN
+                {_apply(_rows('new_shows', 1))}
+            ELSIF TG_OP = 'DELETE' THEN
+                {_apply(_rows('old_shows', -1))}
+            ELSE
+                {_apply(_rows('old_shows', -1) + ' UNION ALL '
+                        + _rows('new_shows', 1))}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute('DROP TRIGGER show_counters_trigger ON "Show"')
+    for event in EVENTS:
+        tables = {
+            'insert': 'NEW TABLE AS new_shows',
+            'update': 'OLD TABLE AS old_shows NEW TABLE AS new_shows',
+            'delete': 'OLD TABLE AS old_shows',
+        }[event]
+        op.execute(f"""
+            CREATE TRIGGER show_counters_{event}_trigger
+            AFTER {event.upper()} ON "Show"
+            REFERENCING {tables}
+            FOR EACH STATEMENT EXECUTE PROCEDURE show_counters_update()
+        """)
+
+
+def _apply_row(row, sign):
+    return '\n'.join(f"""
+                UPDATE "{table}" SET
+                    upcoming_show_count = upcoming_show_count
+                        {sign} ({row}.show_time > rolled)::int,
+                    past_show_count = past_show_count
+                        {sign} ({row}.show_time <= rolled)::int
+                WHERE id = {row}.{column};""" for table, column in TABLES)
+
+
+def downgrade():
+    for event in EVENTS:
+        op.execute(f'DROP TRIGGER show_counters_{event}_trigger ON "Show"')
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION show_counters_update() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            rolled timestamp;
+        BEGIN
+            SELECT rolled_at INTO rolled FROM show_counter_state FOR SHARE;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.show_time IS NOT NULL THEN
+                {_apply_row('OLD', '-')}
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.show_time IS NOT NULL THEN
+                {_apply_row('NEW', '+')}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER show_counters_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF venue_id, artist_id, show_time
+        ON "Show"
+        FOR EACH ROW EXECUTE PROCEDURE show_counters_update()
+    """)
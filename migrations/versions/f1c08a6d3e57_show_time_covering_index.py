@@ -0,0 +1,34 @@
+"""show_time covering index
+
+Revision ID: f1c08a6d3e57
+Revises: e4a71c3b9d52
+Create Date: 2026-10-18 17:20:44.105362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c08a6d3e57'
+down_revision = 'e4a71c3b9d52'
+branch_labels = None
+depends_on = None
+
+
+# Lets /shows/calendar count a date window with an index-only scan, the
+# venue and artist ids for the city and genre joins included.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_show_show_time_venue_id_artist_id', 'Show',
+            ['show_time', 'venue_id', 'artist_id'],
+            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_show_show_time_venue_id_artist_id', table_name='Show',
+            postgresql_concurrently=True)
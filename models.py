@@ -1,5 +1,14 @@
-from app import db
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+
+from replicas import RoutingSQLAlchemy
+
+# Sends read-only requests to the replica when one is configured
+db = RoutingSQLAlchemy()
+
+# Minutes a show occupies its venue and artist when none is given
+DEFAULT_SHOW_DURATION = 120
+MAX_SHOW_DURATION = 24 * 60
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -8,10 +17,18 @@ from datetime import datetime
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_city_state', 'city', 'state'),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index(
+            'ix_venue_geohash', 'geohash',
+            postgresql_ops={'geohash': 'varchar_pattern_ops'}),
+        db.Index('ix_venue_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(ARRAY(db.String()))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
@@ -19,8 +36,26 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(250))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    # Kept in step with the coordinates by geo.py
+    geohash = db.Column(db.String(12))
     seeking_talent = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String(), default='')
+    # Maintained by a database trigger, see the search_vectors migration
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    updated_at = db.Column(
+        db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    # Bumped by a database trigger whenever the row changes, keys the
+    # template fragment cache (see the version_triggers migration)
+    version = db.Column(
+        db.Integer, nullable=False, server_default='1',
+        server_onupdate=db.FetchedValue())
+    # Maintained by a database trigger on Show, see counters.py
+    upcoming_show_count = db.Column(
+        db.Integer, nullable=False, server_default='0')
+    past_show_count = db.Column(
+        db.Integer, nullable=False, server_default='0')
     shows = db.relationship('Show', backref='venue', lazy=True)
 
     def __init__(
@@ -45,10 +80,14 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_updated_at', 'updated_at'),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    genres = db.Column(db.ARRAY(db.String()), nullable=False)
+    genres = db.Column(ARRAY(db.String()), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
@@ -57,6 +96,20 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String(), default='')
     image_link = db.Column(db.String(500))
+    # Maintained by a database trigger, see the search_vectors migration
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    updated_at = db.Column(
+        db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    # Bumped by a database trigger whenever the row changes, keys the
+    # template fragment cache (see the version_triggers migration)
+    version = db.Column(
+        db.Integer, nullable=False, server_default='1',
+        server_onupdate=db.FetchedValue())
+    # Maintained by a database trigger on Show, see counters.py
+    upcoming_show_count = db.Column(
+        db.Integer, nullable=False, server_default='0')
+    past_show_count = db.Column(
+        db.Integer, nullable=False, server_default='0')
     shows = db.relationship('Show', backref='artist', lazy=True)
 
     def __init__(
@@ -79,17 +132,43 @@ class Artist(db.Model):
 
 
 class Show(db.Model):
+    # Partitioned by year on show_time, see the show_partitions migration
+    # and partitions.py. The primary key there is (id, show_time).
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_show_time', 'venue_id', 'show_time'),
+        db.Index('ix_show_artist_id_show_time', 'artist_id', 'show_time'),
+        db.Index(
+            'ix_show_show_time_brin', 'show_time', postgresql_using='brin'),
+        db.Index(
+            'ix_show_show_time_venue_id_artist_id',
+            'show_time', 'venue_id', 'artist_id'),
+        db.Index('ix_show_updated_at', 'updated_at'),
+    )
 
     id = id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     show_time = db.Column(db.DateTime, default=datetime.utcnow())
-
-    def __init__(self, venue_id, artist_id, show_time):
+    # Overlapping shows of a venue or an artist are rejected by exclusion
+    # constraints, see the show_booking_constraints migration
+    duration = db.Column(
+        db.Integer, nullable=False, default=DEFAULT_SHOW_DURATION,
+        server_default=str(DEFAULT_SHOW_DURATION))
+    updated_at = db.Column(
+        db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    # Bumped by a database trigger whenever the row changes, keys the
+    # template fragment cache (see the version_triggers migration)
+    version = db.Column(
+        db.Integer, nullable=False, server_default='1',
+        server_onupdate=db.FetchedValue())
+
+    def __init__(self, venue_id, artist_id, show_time, duration=None):
         self.venue_id = venue_id
         self.artist_id = artist_id
         self.show_time = show_time
+        if duration is not None:
+            self.duration = duration
 
     def __repr__(self):
         return f'<Show {self.id}>'
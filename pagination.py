@@ -0,0 +1,60 @@
+from flask import Response, current_app, request, stream_with_context, url_for
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+
+class KeysetPage:
+    # One page of a keyset paginated query. Rows are formatted while the
+    # template iterates over the page, so it can be streamed to the client.
+    # Once iteration is done next_url points to the following page, if any.
+
+    def __init__(self, query, limit, cursor_for, formatter):
+        self.query = query if limit is None else query.limit(limit + 1)
+        self.limit = limit
+        self.cursor_for = cursor_for
+        self.formatter = formatter
+        self.next_cursor = None
+
+    def __iter__(self):
+        previous = None
+        for count, row in enumerate(self.query):
+            if count == self.limit:
+                self.next_cursor = self.cursor_for(previous)
+                break
+            previous = row
+            yield self.formatter(row)
+
+    @property
+    def next_url(self):
+        if self.next_cursor is None:
+            return None
+        args = request.args.to_dict(flat=False)
+        args['after'] = self.next_cursor
+        return url_for(request.endpoint, **args)
+
+
+def is_streamed():
+    return request.args.get('stream') == '1'
+
+
+def page_limit():
+    # Page size requested with ?limit=, bounded by MAX_PAGE_SIZE. Streamed
+    # pages are unbounded unless a limit is given explicitly.
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        if is_streamed():
+            return None
+        limit = current_app.config['PAGE_SIZE']
+    return max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def stream_template(template_name, **context):
+    # Renders a template chunk by chunk, sending the first bytes before
+    # the query behind it has been fully fetched
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(current_app.config['STREAM_BUFFER_SIZE'])
+    return Response(stream_with_context(stream))
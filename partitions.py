@@ -0,0 +1,171 @@
+import gzip
+import os
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+import counters
+from models import db
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# Show is range partitioned by year on show_time (see the show_partitions
+# migration), so queries bounded on show_time only scan the years they
+# touch. `flask show-partitions create` adds the coming years ahead of
+# time, shows beyond them land in "Show_default" until their year is
+# created. `flask show-partitions archive` detaches past years, writes
+# them to gzipped CSV files and drops them.
+
+PARTITION_PREFIX = 'Show_'
+
+PARTITIONS_SQL = '''
+SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = '"Show"'::regclass
+ORDER BY c.relname
+'''
+
+# Subtracts the shows of a partition from the past counters
+UNCOUNT_SQL = '''
+UPDATE "{table}" t SET past_show_count = t.past_show_count - m.shows
+FROM (
+    SELECT {column}, count(*) AS shows FROM "{partition}" GROUP BY {column}
+) m
+WHERE t.id = m.{column}
+'''
+
+
+def partition_year(name):
+    # Year of a "Show_<year>" partition, None for the default partition
+    suffix = name[len(PARTITION_PREFIX):]
+    return int(suffix) if suffix.isdigit() else None
+
+
+def partitions():
+    # [(name, year, estimated rows, bytes)] of the attached partitions
+    return [
+        (name, partition_year(name), rows, size)
+        for name, rows, size in db.session.execute(text(PARTITIONS_SQL))]
+
+
+def create_partitions(years_ahead, now=None):
+    # Creates the partitions of this year, the next years_ahead years and
+    # any year waiting in the default partition, returns the years added
+    now = now or datetime.now()
+    years = set(range(now.year, now.year + years_ahead + 1))
+    years.update(int(year) for year, in db.session.execute(text(
+        'SELECT DISTINCT extract(year FROM show_time) FROM "Show_default"')))
+
+    created = [
+        year for year in sorted(years) if db.session.execute(
+            text('SELECT show_create_partition(:year)'),
+            {'year': year}).scalar()]
+    db.session.commit()
+    return created
+
+
+def archive_partition(name, directory=None):
+    # Detaches a past partition, taking its shows off the past counters.
+    # With a directory, it is written there as <name>.csv.gz and dropped,
+    # otherwise left as a standalone table. Returns the file path.
+    year = partition_year(name)
+    if year is None:
+        raise ValueError(f'{name} is not a yearly partition')
+    # Shows are only counted as past once rolled over
+    if datetime(year + 1, 1, 1) > counters.lock_state():
+        db.session.rollback()
+        raise ValueError(f'{name} still has shows counted as upcoming')
+
+    for table, column in counters.TABLES:
+        db.session.execute(text(UNCOUNT_SQL.format(
+            table=table, column=column, partition=name)))
+    db.session.execute(text(f'ALTER TABLE "Show" DETACH PARTITION "{name}"'))
+    # Fires no delete trigger, the /shows ETag still has to change
+    db.session.execute(text(
+        'UPDATE show_counter_state SET show_deletes = show_deletes + 1'))
+    if directory is None:
+        db.session.commit()
+        return None
+
+    path = os.path.join(directory, f'{name}.csv.gz')
+    partial = path + '.partial'
+    try:
+        with gzip.open(partial, 'wb') as output:
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert(
+                f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', output)
+        db.session.execute(text(f'DROP TABLE "{name}"'))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return path
+
+
+def _require_postgres():
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Show partitions need PostgreSQL.')
+
+
+@click.group('show-partitions')
+def partitions_command():
+    """Manage the yearly partitions of the Show table."""
+
+
+@partitions_command.command('list')
+@with_appcontext
+def list_command():
+    """List the partitions with their estimated size."""
+    _require_postgres()
+    for name, _, rows, size in partitions():
+        click.echo(f'{name}: ~{max(rows, 0)} rows, {size // 1024} KB')
+
+
+@partitions_command.command('create')
+@click.option('--years-ahead', type=int,
+              help='Years to create past this one, '
+                   'SHOW_PARTITION_YEARS_AHEAD by default.')
+@with_appcontext
+def create_command(years_ahead):
+    """Create the partitions of the coming years."""
+    _require_postgres()
+    if years_ahead is None:
+        years_ahead = current_app.config['SHOW_PARTITION_YEARS_AHEAD']
+    created = create_partitions(years_ahead)
+    click.echo('Created ' + (', '.join(
+        f'{PARTITION_PREFIX}{year}' for year in created) or 'no partitions')
+        + '.')
+
+
+@partitions_command.command('archive')
+@click.option('--before', type=int, required=True,
+              help='Archive the years before this one.')
+@click.option('--dir', 'directory',
+              help='Where to write the files, SHOW_ARCHIVE_DIR by default.')
+@click.option('--detach-only', is_flag=True,
+              help='Keep the detached partitions as tables, no files.')
+@with_appcontext
+def archive_command(before, directory, detach_only):
+    """Detach past years and archive them to gzipped CSV files."""
+    _require_postgres()
+    if not detach_only:
+        directory = directory or current_app.config['SHOW_ARCHIVE_DIR']
+        os.makedirs(directory, exist_ok=True)
+
+    for name, year, _, _ in partitions():
+        if year is None or year >= before:
+            continue
+        try:
+            path = archive_partition(
+                name, None if detach_only else directory)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Archived {name} to {path}.' if path
+                   else f'Detached {name}.')
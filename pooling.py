@@ -0,0 +1,212 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+
+class PoolStats:
+    # Pool and statement counters of one engine, read by /metrics
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.wait_time = 0
+        self.max_wait_time = 0
+        self.statements = 0
+        self.statement_time = 0
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, elapsed, timed_out=False):
+        with self._lock:
+            self.wait_time += elapsed
+            self.max_wait_time = max(self.max_wait_time, elapsed)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_checkout(self, overflow):
+        with self._lock:
+            self.checkouts += 1
+            if overflow:
+                self.overflow_checkouts += 1
+
+    def record_statement(self, elapsed):
+        with self._lock:
+            self.statements += 1
+            self.statement_time += elapsed
+
+
+# Per engine name ('primary', 'replica'), filled by instrument
+engine_stats = {}
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that records how long checkouts wait for a connection, in
+    # the stats instrument() gives it
+
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.stats:
+                self.stats.record_wait(time.perf_counter() - started, True)
+            raise
+        if self.stats:
+            self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(config):
+    # SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings
+    options = {}
+    connect_args = {}
+
+    if config['DB_PGBOUNCER']:
+        # PgBouncer does the pooling and drops startup parameters, the
+        # statement timeout is set per transaction instead (see instrument)
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+            pool_pre_ping=config['DB_POOL_PRE_PING'])
+        if config['DB_STATEMENT_TIMEOUT']:
+            connect_args['options'] = \
+                '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT']
+
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def init_app(app, cli=False):
+    # Must run before the engine is created. cli is set for apps loaded by
+    # the flask command, which use DB_CLI_STATEMENT_TIMEOUT.
+    if cli:
+        app.config['DB_STATEMENT_TIMEOUT'] = \
+            app.config['DB_CLI_STATEMENT_TIMEOUT']
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres'):
+        return
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def instrument(engine, config, name='primary'):
+    # Attaches the pool and statement counters, and in PgBouncer mode the
+    # per transaction statement timeout, to an engine
+    pool = engine.pool
+    stats = engine_stats[name] = PoolStats()
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.stats = stats
+
+    @event.listens_for(pool, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        stats.increment('connects')
+
+    @event.listens_for(pool, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        overflow = isinstance(pool, QueuePool) and pool.overflow() > 0
+        stats.record_checkout(overflow)
+
+    @event.listens_for(pool, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.increment('invalidations')
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def on_execute(conn, cursor, statement, parameters, context,
+                   executemany):
+        conn.info.setdefault('engine_start_time', []).append(
+            time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def on_executed(conn, cursor, statement, parameters, context,
+                    executemany):
+        stats.record_statement(
+            time.perf_counter() - conn.info['engine_start_time'].pop())
+
+    if config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT']:
+        @event.listens_for(engine, 'begin')
+        def on_begin(connection):
+            connection.execute(
+                'SET LOCAL statement_timeout = %d'
+                % config['DB_STATEMENT_TIMEOUT'])
+
+
+def prefill(engine):
+    # Opens pool_size connections up front so a fresh worker doesn't pay
+    # for them on its first requests
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    connections = [engine.connect() for _ in range(pool.size())]
+    for connection in connections:
+        connection.close()
+
+
+# name: (type, help, value of (pool, stats))
+POOL_METRICS = {
+    'fyyur_db_pool_size': (
+        'gauge', 'Configured pool size.',
+        lambda pool, stats: pool.size() if isinstance(pool, QueuePool)
+        else 0),
+    'fyyur_db_pool_checked_out': (
+        'gauge', 'Connections currently checked out.',
+        lambda pool, stats: pool.checkedout()
+        if isinstance(pool, QueuePool) else 0),
+    'fyyur_db_pool_checkouts_total': (
+        'counter', 'Connection checkouts.',
+        lambda pool, stats: stats.checkouts),
+    'fyyur_db_pool_overflow_checkouts_total': (
+        'counter', 'Checkouts served by overflow connections.',
+        lambda pool, stats: stats.overflow_checkouts),
+    'fyyur_db_pool_timeouts_total': (
+        'counter', 'Checkouts that timed out waiting for a connection.',
+        lambda pool, stats: stats.timeouts),
+    'fyyur_db_pool_connects_total': (
+        'counter', 'New database connections opened.',
+        lambda pool, stats: stats.connects),
+    'fyyur_db_pool_invalidations_total': (
+        'counter', 'Connections invalidated, e.g. after a failed pre-ping.',
+        lambda pool, stats: stats.invalidations),
+    'fyyur_db_pool_wait_seconds_total': (
+        'counter', 'Time spent waiting for a connection.',
+        lambda pool, stats: stats.wait_time),
+    'fyyur_db_pool_max_wait_seconds': (
+        'gauge', 'Longest wait for a connection.',
+        lambda pool, stats: stats.max_wait_time),
+    'fyyur_db_statements_total': (
+        'counter', 'SQL statements executed.',
+        lambda pool, stats: stats.statements),
+    'fyyur_db_statement_seconds_total': (
+        'counter', 'Time spent in SQL statements.',
+        lambda pool, stats: stats.statement_time),
+}
+
+
+def metrics(engines):
+    # (name, type, help, {labels: value}) tuples for /metrics, one sample
+    # per engine of the {name: engine} dict
+    return [
+        (name, type, help, {
+            f'engine="{engine_name}"': value(
+                engine.pool, engine_stats.get(engine_name) or PoolStats())
+            for engine_name, engine in engines.items()})
+        for name, (type, help, value) in POOL_METRICS.items()]
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+
+#----------------------------------------------------------------------------#
+# Read replica.
+#----------------------------------------------------------------------------#
+
+# With DATABASE_REPLICA_URL set, GET and HEAD requests, and views marked
+# @read_only, run their queries on the replica, everything else on the
+# primary. Flushes always go to the primary. A client whose request
+# committed something keeps reading from the primary for
+# REPLICA_STICKY_SECONDS, so it sees its own changes despite replication
+# lag.
+
+REPLICA_BIND = 'replica'
+READ_METHODS = {'GET', 'HEAD'}
+
+
+def read_only(view):
+    # Lets a view that doesn't write read from the replica whatever its
+    # method, e.g. a search form POST
+    view.read_only = True
+    return view
+
+
+def has_replica(app):
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def engines(app=None):
+    # {'primary': engine, 'replica': engine} of the app, without the
+    # replica when none is configured
+    app = app or current_app
+    db = app.extensions['sqlalchemy'].db
+    found = {'primary': db.get_engine(app)}
+    if has_replica(app):
+        found['replica'] = db.get_engine(app, bind=REPLICA_BIND)
+    return found
+
+
+def current_engine():
+    # Engine the current request reads from
+    role = g.get('db_role') if has_request_context() else None
+    return engines()['replica' if role == 'replica' else 'primary']
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_request_context() and \
+                g.get('db_role') == 'replica':
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session):
+    # Any commit on the primary, as bulk Query.delete() and update() and
+    # session.execute() write without a flush
+    if has_request_context() and g.get('db_role') != 'replica':
+        g.db_wrote = True
+
+
+class ReplicaRouter:
+    # Picks the engine of every request and counts the choices
+
+    def __init__(self, app=None):
+        self.routed = {'primary': 0, 'replica': 0, 'sticky': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not has_replica(app):
+            return
+        app.before_request(self._route)
+        app.after_request(self._stick)
+
+    def _count(self, name):
+        with self._lock:
+            self.routed[name] += 1
+
+    def _route(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if request.method not in READ_METHODS and \
+                not getattr(view, 'read_only', False):
+            g.db_role = 'primary'
+        elif session.get('db_primary_until', 0) > time.time():
+            g.db_role = 'primary'
+            self._count('sticky')
+        else:
+            g.db_role = 'replica'
+        self._count(g.db_role)
+
+    def _stick(self, response):
+        if g.get('db_wrote'):
+            session['db_primary_until'] = \
+                time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+        return response
+
+    def metrics(self):
+        # (name, type, help, value) tuples for /metrics
+        with self._lock:
+            routed = dict(self.routed)
+        return [
+            ('fyyur_db_routed_requests_total', 'counter',
+                'Requests per engine their queries were sent to.',
+                {f'engine="{name}"': routed[name]
+                 for name in ('primary', 'replica')}),
+            ('fyyur_db_sticky_requests_total', 'counter',
+                'Reads sent to the primary after a recent write.',
+                routed['sticky']),
+        ]
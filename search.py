@@ -0,0 +1,88 @@
+import re
+from flask import current_app
+from markupsafe import Markup, escape
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Columns every searchable model exposes to the index
+SEARCH_COLUMNS = ('name', 'city', 'genres')
+
+
+def highlight(value, term):
+    # Wraps every occurrence of the search term in <mark>, escaping the rest
+    if not value:
+        return Markup('')
+    if not term:
+        return escape(value)
+
+    pattern = re.compile(re.escape(term), re.IGNORECASE)
+    result = Markup('')
+    position = 0
+    for match in pattern.finditer(value):
+        result += escape(value[position:match.start()])
+        result += Markup('<mark>%s</mark>') % match.group()
+        position = match.end()
+    return result + escape(value[position:])
+
+
+def _like_pattern(term):
+    term = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{term}%'
+
+
+class PostgresSearchBackend:
+    # tsvector + pg_trgm backend, indexes are created by the
+    # search_vectors migration. The app needs PostgreSQL, other dialects
+    # have no backend.
+
+    def search(self, model, term, limit):
+        # Queries
+        query = db.func.plainto_tsquery('simple', term)
+        pattern = _like_pattern(term)
+        rank = (db.func.ts_rank(model.search_vector, query) +
+                db.func.similarity(model.name, term))
+
+        rows = db.session.query(
+            model.id, model.name,
+            db.func.count().over().label('total')).filter(db.or_(
+                model.search_vector.op('@@')(query),
+                model.name.ilike(pattern),
+                model.city.ilike(pattern),
+                db.func.genres_text(model.genres).ilike(pattern))).order_by(
+            rank.desc(), model.name).limit(limit).all()
+
+        return [(row.id, row.name) for row in rows], (
+            rows[0].total if rows else 0)
+
+
+backends = {
+    'postgresql': PostgresSearchBackend(),
+}
+
+
+def get_backend():
+    return backends[db.engine.dialect.name]
+
+
+def search(model, term, limit=None):
+    # Returns the top ranked matches for term together with the total
+    # number of matches, counted by the database
+    term = term.strip()
+    if limit is None:
+        limit = current_app.config['SEARCH_RESULTS_LIMIT']
+
+    rows, count = get_backend().search(model, term, limit)
+
+    return {
+        'count': count,
+        'data': [{
+            'id': row_id,
+            'name': name,
+            'name_highlight': highlight(name, term)
+        } for row_id, name in rows]
+    }
+
@@ -0,0 +1,159 @@
+import random
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION
+from forms import genres
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('San Francisco', 'CA'),
+    ('Chicago', 'IL'), ('Austin', 'TX'), ('Houston', 'TX'),
+    ('Nashville', 'TN'), ('Memphis', 'TN'), ('New Orleans', 'LA'),
+    ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'),
+    ('Atlanta', 'GA'), ('Miami', 'FL'), ('Boston', 'MA'),
+    ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'),
+]
+NAME_WORDS = [
+    'Blue', 'Velvet', 'Electric', 'Midnight', 'Golden', 'Silver', 'Royal',
+    'Hollow', 'Wild', 'Crimson', 'Echo', 'Lunar', 'Neon', 'Rusty', 'Lucky',
+]
+VENUE_WORDS = ['Hall', 'Lounge', 'Club', 'Room', 'Theatre', 'Bar', 'Garden']
+ARTIST_WORDS = ['Band', 'Trio', 'Collective', 'Orchestra', 'Project', 'Crew']
+GENRES = [genre for genre, _ in genres]
+
+BATCH_SIZE = 5000
+# Shows start on slot boundaries, so venues and artists are double booked
+# exactly when they appear twice in the same slot
+SLOT = timedelta(minutes=DEFAULT_SHOW_DURATION)
+SLOT_ATTEMPTS = 10
+
+
+def _name(rng, suffixes, index):
+    return f'{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} ' \
+        f'{rng.choice(suffixes)} {index}'
+
+
+def _phone(rng):
+    return f'{rng.randint(200, 999)}-{rng.randint(100, 999)}-' \
+        f'{rng.randint(0, 9999):04d}'
+
+
+def _zipf_weights(count, exponent):
+    # Popularity skew: the k-th entity gets weight 1 / k^exponent
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+
+def generate(num_venues, num_artists, num_shows, seed=0, skew=1.1,
+             past_ratio=0.6, now=None):
+    # Inserts num_venues venues, num_artists artists and num_shows shows.
+    # Shows per venue and per artist follow a Zipf distribution, show times
+    # are spread over the last two years (past_ratio) and the next one.
+    # A show whose venue or artist stays booked after SLOT_ATTEMPTS draws
+    # is dropped, so slightly fewer shows may be inserted.
+    rng = random.Random(seed)
+    now = now or datetime.now()
+
+    venues = []
+    for index in range(num_venues):
+        city, state = rng.choice(CITIES)
+        venues.append({
+            'name': _name(rng, VENUE_WORDS, index),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'city': city,
+            'state': state,
+            'address': f'{rng.randint(1, 9999)} {rng.choice(NAME_WORDS)} St',
+            'phone': _phone(rng),
+            'image_link': f'https://example.com/venues/{index}.jpg',
+            'facebook_link': f'https://www.facebook.com/venue{index}',
+            'website': f'https://venue{index}.example.com',
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': '',
+        })
+    _insert(Venue, venues)
+
+    artists = []
+    for index in range(num_artists):
+        city, state = rng.choice(CITIES)
+        artists.append({
+            'name': _name(rng, ARTIST_WORDS, index),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'website': f'https://artist{index}.example.com',
+            'facebook_link': f'https://www.facebook.com/artist{index}',
+            'seeking_venue': rng.random() < 0.3,
+            'seeking_description': '',
+            'image_link': f'https://example.com/artists/{index}.jpg',
+        })
+    _insert(Artist, artists)
+
+    venue_ids = [row.id for row in db.session.query(Venue.id).order_by(
+        Venue.id.desc()).limit(num_venues)]
+    artist_ids = [row.id for row in db.session.query(Artist.id).order_by(
+        Artist.id.desc()).limit(num_artists)]
+
+    # Shuffle so popularity isn't correlated with id order
+    rng.shuffle(venue_ids)
+    rng.shuffle(artist_ids)
+    venue_weights = _zipf_weights(len(venue_ids), skew)
+    artist_weights = _zipf_weights(len(artist_ids), skew)
+
+    epoch = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    booked = set()
+    inserted = 0
+    for start in range(0, num_shows, BATCH_SIZE):
+        size = min(BATCH_SIZE, num_shows - start)
+        show_venues = rng.choices(venue_ids, venue_weights, k=size)
+        show_artists = rng.choices(artist_ids, artist_weights, k=size)
+        shows = []
+        for venue_id, artist_id in zip(show_venues, show_artists):
+            for _ in range(SLOT_ATTEMPTS):
+                if rng.random() < past_ratio:
+                    offset = -rng.uniform(0, 730)
+                else:
+                    offset = rng.uniform(0, 365)
+                slot = (now + timedelta(days=offset) - epoch) // SLOT
+                if ('venue', venue_id, slot) not in booked and \
+                        ('artist', artist_id, slot) not in booked:
+                    break
+            else:
+                continue
+            booked.add(('venue', venue_id, slot))
+            booked.add(('artist', artist_id, slot))
+            shows.append({
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'show_time': epoch + slot * SLOT,
+                'duration': DEFAULT_SHOW_DURATION,
+            })
+        _insert(Show, shows)
+        inserted += len(shows)
+
+    return len(venues), len(artists), inserted
+
+
+@click.command('seed')
+@click.option('--venues', default=1000, help='Number of venues.')
+@click.option('--artists', default=2000, help='Number of artists.')
+@click.option('--shows', default=20000, help='Number of shows.')
+@click.option('--seed', default=0, help='Random seed.')
+@click.option('--skew', default=1.1, help='Zipf exponent for shows per venue.')
+@click.option('--past-ratio', default=0.6, help='Fraction of past shows.')
+@with_appcontext
+def seed_command(venues, artists, shows, seed, skew, past_ratio):
+    """Fill the database with synthetic venues, artists and shows."""
+    counts = generate(venues, artists, shows, seed, skew, past_ratio)
+    click.echo('Inserted %d venues, %d artists and %d shows.' % counts)
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+import config
+import seed
+from app import create_app
+from models import db
+
+#----------------------------------------------------------------------------#
+# Fixtures.
+#----------------------------------------------------------------------------#
+
+# The app needs PostgreSQL (arrays, full-text search, partitions, triggers),
+# so the tests run against TEST_DATABASE_URL and are skipped without it. The
+# database is wiped and migrated from scratch at the start of every run.
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+MIGRATIONS = os.path.join(config.basedir, 'migrations')
+
+
+def make_app(**settings):
+    # App on the test database, with settings overriding config.py
+    settings.setdefault('SQLALCHEMY_DATABASE_URI', TEST_DATABASE_URL)
+    settings.setdefault('SECRET_KEY', 'test')
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in settings.items():
+            patch.setattr(config, name, value, raising=False)
+        app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    app = make_app()
+    with app.app_context():
+        db.session.execute(text('DROP SCHEMA public CASCADE'))
+        db.session.execute(text('CREATE SCHEMA public'))
+        db.session.commit()
+        upgrade(directory=MIGRATIONS)
+        seed.generate(50, 100, 1000)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements():
+    # (statement, parameters) of the SQL run on any engine during the test
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(Engine, 'before_cursor_execute', record)
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from booking import LOCK_NAMESPACES, boundary_conflict
+from importer import reject_conflicts
+from models import db, Artist, Show, Venue, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Bookings across partitions.
+#----------------------------------------------------------------------------#
+
+
+def booked_show(start_time, duration=120):
+    # (show, another artist id), with nothing else booked for the venue and
+    # the two artists around the new year
+    venue_id = db.session.query(Venue.id).order_by(Venue.id).first()[0]
+    artist_id, other_id = [row.id for row in db.session.query(
+        Artist.id).order_by(Artist.id).limit(2)]
+    Show.query.filter(
+        (Show.venue_id==venue_id)
+        | Show.artist_id.in_([artist_id, other_id]),
+        Show.show_time.between(datetime(2027, 12, 30), datetime(2028, 1, 3)),
+    ).delete(synchronize_session=False)
+    show = Show(venue_id, artist_id, start_time, duration)
+    db.session.add(show)
+    db.session.commit()
+    return show, other_id
+
+
+def is_locked(kind, id):
+    # Whether another transaction holds the booking lock
+    with db.engine.connect() as connection:
+        with connection.begin():
+            return not connection.execute(
+                text('SELECT pg_try_advisory_xact_lock(:namespace, :id)'),
+                namespace=LOCK_NAMESPACES[kind], id=id).scalar()
+
+
+def test_boundary_check_holds_the_booking_locks(app):
+    with app.app_context():
+        show, other_id = booked_show(datetime(2027, 12, 31, 23))
+        proposal = {
+            'venue_id': show.venue_id,
+            'artist_id': other_id,
+            'start_time': datetime(2028, 1, 1, 0, 30),
+            'duration': 60,
+        }
+        assert boundary_conflict(proposal) == 'venue'
+        assert is_locked('venue', show.venue_id)
+        assert is_locked('artist', other_id)
+
+        db.session.rollback()
+        assert not is_locked('venue', show.venue_id)
+
+
+def test_imported_shows_across_the_new_year_are_rejected(app):
+    with app.app_context():
+        show, other_id = booked_show(datetime(2027, 12, 31, 23))
+        batch = [(1, {
+            'venue_id': show.venue_id,
+            'artist_id': other_id,
+            'show_time': datetime(2028, 1, 1, 0, 30),
+            'duration': 60,
+        }), (2, {
+            'venue_id': show.venue_id,
+            'artist_id': other_id,
+            'show_time': datetime(2028, 1, 1, 3),
+            'duration': 60,
+        })]
+        kept, rejected = reject_conflicts(batch)
+        assert [line for line, _ in kept] == [2]
+        assert [line for line, _ in rejected] == [1]
+        assert is_locked('venue', show.venue_id)
+        db.session.rollback()
+
+
+def test_invalid_show_is_not_reported_as_created(app, client):
+    with app.app_context():
+        venue_id = db.session.query(Venue.id).first()[0]
+        artist_id = db.session.query(Artist.id).first()[0]
+        shows = Show.query.count()
+
+    response = client.post('/shows/create', data={
+        'venue_id': venue_id,
+        'artist_id': artist_id,
+        'start_time': '2031-06-01 20:00:00',
+        'duration': MAX_SHOW_DURATION + 1,
+    })
+    page = response.get_data(as_text=True)
+    assert 'successfully created' not in page
+    assert 'duration: ' in page
+    with app.app_context():
+        assert Show.query.count() == shows
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app import metrics
+from concurrency import QueryTimeout, fetch_all
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Concurrent queries.
+#----------------------------------------------------------------------------#
+
+
+def statements_run(endpoint):
+    histograms = metrics.histograms.get(endpoint)
+    return histograms['fyyur_request_db_statements'].sum if histograms else 0
+
+
+def test_concurrent_statements_count_towards_the_request(app, client):
+    with app.app_context():
+        venue_id = db.session.query(Venue.id).first()[0]
+    app.config['DETAIL_QUERY_MODE'] = 'concurrent'
+    try:
+        before = statements_run('main.show_venue')
+        response = client.get(f'/venues/{venue_id}?nocache=1')
+    finally:
+        app.config['DETAIL_QUERY_MODE'] = 'single'
+    assert response.status_code == 200
+    # The venue, its past and its upcoming shows
+    assert statements_run('main.show_venue') - before >= 3
+
+
+def test_timed_out_statements_are_cancelled(app):
+    app.config['CONCURRENT_QUERY_TIMEOUT'] = 0.2
+    try:
+        with app.test_request_context():
+            setting, = fetch_all(
+                text("SELECT current_setting('statement_timeout')"))
+            assert setting[0][0] == '200ms'
+
+            started = time.perf_counter()
+            with pytest.raises(QueryTimeout):
+                fetch_all(text('SELECT pg_sleep(5)'))
+    finally:
+        app.config['CONCURRENT_QUERY_TIMEOUT'] = 5
+
+    # The server gave up on the statement too, no connection is held
+    with app.app_context():
+        while db.session.execute(text(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE query = 'SELECT pg_sleep(5)' AND state = 'active'"
+                )).scalar():
+            db.session.rollback()
+            assert time.perf_counter() - started < 2
+            time.sleep(0.05)
@@ -0,0 +1,19 @@
+import pytest
+
+from conftest import make_app
+
+#----------------------------------------------------------------------------#
+# Settings.
+#----------------------------------------------------------------------------#
+
+
+def test_secret_key_is_required_outside_debug(app, monkeypatch):
+    monkeypatch.delenv('FLASK_DEBUG', raising=False)
+    monkeypatch.delenv('FLASK_ENV', raising=False)
+    with pytest.raises(RuntimeError):
+        make_app(SECRET_KEY=None)
+
+
+def test_debug_falls_back_to_a_random_secret_key(app, monkeypatch):
+    monkeypatch.setenv('FLASK_DEBUG', '1')
+    assert make_app(SECRET_KEY=None).config['SECRET_KEY']
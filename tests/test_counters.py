@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import counters
+from importer import copy_rows, insert_rows
+from models import db, Artist, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+
+def shows(venue_ids, artist_ids, start, count):
+    # Shows an hour apart, far enough in the future to overlap nothing
+    return [{
+        'venue_id': venue_ids[index % len(venue_ids)],
+        'artist_id': artist_ids[index % len(artist_ids)],
+        'show_time': start + timedelta(hours=index),
+        'duration': 30,
+    } for index in range(count)]
+
+
+def test_counters_follow_bulk_changes(app):
+    with app.app_context():
+        venue_ids = [row.id for row in db.session.query(Venue.id).limit(3)]
+        artist_ids = [row.id for row in db.session.query(Artist.id).limit(4)]
+        copy_rows(Show, shows(venue_ids, artist_ids, datetime(2031, 1, 1), 50))
+        insert_rows(
+            Show, shows(venue_ids, artist_ids, datetime(2032, 1, 1), 50))
+        db.session.commit()
+
+        db.session.execute(Show.__table__.update().where(
+            Show.show_time>=datetime(2032, 1, 1)).values(
+            venue_id=venue_ids[0]))
+        db.session.execute(Show.__table__.update().where(
+            Show.show_time.between(datetime(2031, 1, 1),
+                                   datetime(2031, 1, 2))).values(
+            show_time=Show.show_time - timedelta(days=365 * 20)))
+        db.session.execute(Show.__table__.delete().where(
+            Show.show_time>=datetime(2031, 1, 2, 12)))
+        db.session.commit()
+
+        drift = counters.rebuild(dry_run=True)
+        assert drift == {'Venue': [], 'Artist': []}
+
+
+def test_counter_triggers_run_per_statement(app):
+    with app.app_context():
+        row_triggers = db.session.execute(text('''
+            SELECT tgname FROM pg_trigger
+            WHERE tgrelid = '"Show"'::regclass AND tgfoid =
+                'show_counters_update'::regproc AND tgtype & 1 = 1
+        ''')).fetchall()
+    assert row_triggers == []
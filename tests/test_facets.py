@@ -0,0 +1,29 @@
+import pytest
+
+from facets import filter_by_facets
+from models import db, Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Genre and state facets.
+#----------------------------------------------------------------------------#
+
+
+@pytest.mark.parametrize('url', [
+    '/venues?genre=Jazz&nocache=1',
+    '/venues?genre=Jazz&genre=Blues&state=CA&nocache=1',
+    '/artists?genre=Jazz',
+    '/artists?genre=Jazz&state=CA',
+])
+def test_filtered_listings(client, url):
+    assert client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize('model', [Venue, Artist])
+def test_genre_filter_matches_every_genre(app, model):
+    with app.app_context():
+        expected = {row.id for row in db.session.query(model.id, model.genres)
+                    if {'Jazz', 'Blues'} <= set(row.genres or ())}
+        query = filter_by_facets(
+            db.session.query(model.id), model, ['Jazz', 'Blues'], None)
+        assert {row.id for row in query} == expected
+        assert expected
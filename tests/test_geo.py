@@ -0,0 +1,96 @@
+import math
+import random
+
+import pytest
+
+from geo import (
+    GeohashBackend, covered_radius, covering_cells, distance, encode)
+
+#----------------------------------------------------------------------------#
+# Geohash.
+#----------------------------------------------------------------------------#
+
+
+def test_encode():
+    assert encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert encode(0, 0, 1) == 's'
+    assert encode(-90, -180, 3) == '000'
+    # Shorter hashes are prefixes of longer ones
+    assert encode(30.2672, -97.7431).startswith(encode(30.2672, -97.7431, 5))
+
+
+def test_distance():
+    # Paris to London
+    assert distance(48.8566, 2.3522, 51.5074, -0.1278) == \
+        pytest.approx(343.5, abs=1)
+    assert distance(10, 20, 10, 20) == 0
+
+
+@pytest.mark.parametrize('precision', range(1, 8))
+@pytest.mark.parametrize('latitude, longitude', [
+    (30.2672, -97.7431), (0.01, 179.99), (-33.8688, 151.2093),
+    (64.1466, -21.9426),
+])
+def test_covering_cells_hold_every_point_within_the_covered_radius(
+        precision, latitude, longitude):
+    cells = covering_cells(latitude, longitude, precision)
+    radius = covered_radius(latitude, precision)
+    shuffle = random.Random(precision)
+    for _ in range(200):
+        # A point at most radius km away, in any direction
+        km = shuffle.uniform(0, radius)
+        bearing = shuffle.uniform(0, 2 * math.pi)
+        lat = latitude + math.degrees(km / 6371.0088) * math.cos(bearing)
+        lng = longitude + math.degrees(km / 6371.0088) * math.sin(bearing) \
+            / math.cos(math.radians(latitude))
+        lat = min(90.0, max(-90.0, lat))
+        lng = (lng + 180.0) % 360.0 - 180.0
+        if distance(latitude, longitude, lat, lng) <= radius:
+            assert encode(lat, lng, precision) in cells
+
+
+def test_covered_radius_shrinks_with_precision():
+    radii = [covered_radius(30, precision) for precision in range(1, 13)]
+    assert radii == sorted(radii, reverse=True)
+    # Cells narrow towards the poles
+    assert covered_radius(70, 6) < covered_radius(0, 6)
+
+
+#----------------------------------------------------------------------------#
+# Nearest venues.
+#----------------------------------------------------------------------------#
+
+
+class RecordingBackend(GeohashBackend):
+    # No venue anywhere, records the cells searched
+
+    def __init__(self):
+        self.searched = []
+
+    def _candidates(self, cells):
+        self.searched.extend(cells)
+        return []
+
+
+@pytest.mark.parametrize('radius', [None, 20000])
+def test_search_stops_at_precision_one(radius):
+    # Rather than LIKE '%' over every venue
+    backend = RecordingBackend()
+    assert backend.nearest(30.2672, -97.7431, 10, radius) == []
+    assert min(len(cell) for cell in backend.searched) == 1
+
+
+def test_search_within_a_radius_starts_at_covering_cells():
+    backend = RecordingBackend()
+    assert backend.nearest(30.2672, -97.7431, 10, 50) == []
+    assert {len(cell) for cell in backend.searched} == {3}
+
+
+def test_nearby_venues(client):
+    response = client.get(
+        '/venues/nearby?lat=37.77&lng=-122.42&limit=5&radius=20000')
+    assert response.status_code == 200
+    distances = [
+        venue['distance_km'] for venue in response.get_json()['venues']]
+    assert distances == sorted(distances)
+    assert client.get('/venues/nearby?lat=91&lng=0').status_code == 400
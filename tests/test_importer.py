@@ -0,0 +1,67 @@
+import json
+
+from importer import copy_rows, import_file, insert_rows
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+VENUE = {
+    'name': 'Imported Hall',
+    'city': 'Austin',
+    'state': 'TX',
+    'address': '1 Congress Ave',
+    'phone': '512-555-0100',
+    'genres': ['Jazz', 'Blues'],
+    'image_link': 'https://example.com/imported.jpg',
+    'facebook_link': 'https://www.facebook.com/imported',
+    'website': 'https://imported.example.com',
+    'seeking_talent': 'False',
+    'seeking_description': 'Looking for brass bands',
+}
+
+
+def run_import(app, path, kind='venues', use_copy=True):
+    # (loaded, rejected, rejected line numbers)
+    lines = []
+    with app.app_context():
+        loaded, rejected = import_file(
+            kind, str(path), path.suffix[1:], 100, use_copy,
+            lambda line, errors: lines.append(line))
+    return loaded, rejected, lines
+
+
+def test_malformed_ndjson_lines_are_rejected(app, tmp_path):
+    path = tmp_path / 'venues.ndjson'
+    path.write_text('\n'.join([
+        json.dumps(VENUE),
+        '{"name": "Broken',
+        '[1, 2]',
+        json.dumps(dict(VENUE, name='Imported Hall 2')),
+    ]) + '\n')
+    assert run_import(app, path) == (2, 2, [2, 3])
+
+
+def test_copy_loads_the_same_values_as_executemany(app):
+    rows = [
+        dict(VENUE, name='Empty Description', seeking_description=''),
+        dict(VENUE, name='No Phone', phone=None),
+        dict(VENUE, name='Quoted "Hall", \\N', genres=['R&B', 'Jazz, Soul']),
+    ]
+    with app.app_context():
+        for prefix, load in (('Copied', copy_rows), ('Inserted', insert_rows)):
+            load(Venue, [dict(row, name=f'{prefix} {row["name"]}',
+                              seeking_talent=False) for row in rows])
+        db.session.commit()
+        venues = {venue.name: venue for venue in Venue.query.filter(
+            Venue.name.like('Copied %') | Venue.name.like('Inserted %'))}
+
+    for row in rows:
+        copied = venues['Copied ' + row['name']]
+        inserted = venues['Inserted ' + row['name']]
+        for column in row:
+            if column != 'name':
+                assert getattr(copied, column) == getattr(inserted, column)
+    assert venues['Copied Empty Description'].seeking_description == ''
+    assert venues['Copied No Phone'].phone is None
@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Index usage.
+#----------------------------------------------------------------------------#
+
+# The test tables are small enough for sequential scans to win, so they
+# are turned off to see which index the planner picks for each query.
+
+
+def explain(statement, parameters):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def plans(client, statements, url):
+    # EXPLAIN output of every statement a GET of url runs
+    del statements[:]
+    response = client.get(url)
+    assert response.status_code == 200
+    return '\n'.join(explain(*statement) for statement in statements)
+
+
+def indexes(*names):
+    # The given indexes and, on the partitioned Show table, the indexes of
+    # every partition attached to them
+    found = set(names)
+    for name in names:
+        found.update(row[0] for row in db.session.execute(text('''
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:name)
+        '''), {'name': name}))
+    return found
+
+
+def uses(plan, names):
+    return any(f' {name} ' in plan or f' "{name}" ' in plan
+               for name in names)
+
+
+def test_venues_uses_city_state_index(app, client, statements):
+    with app.app_context():
+        plan = plans(client, statements, '/venues?nocache=1')
+        assert uses(plan, indexes('ix_venue_city_state'))
+
+
+def test_venue_uses_venue_show_index(app, client, statements):
+    with app.app_context():
+        venue_id = db.session.query(Show.venue_id).first()[0]
+        # The venue overlap constraints are (venue_id, time range) GiST
+        # indexes, the planner may pick them for the venue_id lookup
+        names = indexes('ix_show_venue_id_show_time') | {
+            row[0] for row in db.session.execute(text(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conname LIKE 'ex_show_%_venue_overlap'"))}
+        plan = plans(client, statements, f'/venues/{venue_id}?nocache=1')
+        assert uses(plan, names)
+
+
+def test_shows_uses_show_time_index(app, client, statements):
+    start = date.today()
+    with app.app_context():
+        plan = plans(client, statements, f'/shows?from={start}&to='
+                     f'{start + timedelta(days=30)}')
+        # The BRIN index, or the covering index added after it
+        assert uses(plan, indexes(
+            'ix_show_show_time_brin', 'ix_show_show_time_venue_id_artist_id'))
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Streamed listings.
+#----------------------------------------------------------------------------#
+
+
+@pytest.fixture
+def options():
+    # (statement, execution options) of the SQL run during the test
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, context.execution_options))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(Engine, 'before_cursor_execute', record)
+
+
+@pytest.mark.parametrize('mode', ['core', 'orm'])
+@pytest.mark.parametrize('url, table', [
+    ('/artists?stream=1', '"Artist"'),
+    ('/shows?stream=1', '"Show"'),
+])
+def test_streamed_listings_use_a_server_side_cursor(
+        app, client, options, mode, url, table):
+    app.config['LISTING_QUERY_MODE'] = mode
+    try:
+        response = client.get(url)
+        response.get_data()
+        response.close()
+    finally:
+        app.config['LISTING_QUERY_MODE'] = 'core'
+
+    listings = [execution_options for statement, execution_options in options
+                if 'ORDER BY' in statement and f'FROM {table}' in statement]
+    assert listings
+    assert all(execution_options.get('stream_results')
+               for execution_options in listings)
@@ -0,0 +1,23 @@
+from app import metrics
+from models import db, Artist
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+
+def rows_returned(endpoint):
+    histograms = metrics.histograms.get(endpoint)
+    return histograms['fyyur_request_db_rows'].sum if histograms else 0
+
+
+def test_streamed_rows_are_counted(app, client):
+    # The export reads through a server-side cursor, whose rowcount is -1
+    with app.app_context():
+        artists = db.session.query(Artist).count()
+    before = rows_returned('exports.export')
+
+    response = client.get('/export/artists?format=ndjson')
+    assert len(response.get_data().splitlines()) == artists
+    response.close()
+    assert rows_returned('exports.export') - before == artists
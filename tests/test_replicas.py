@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import replicas
+from models import db, Venue
+from conftest import TEST_DATABASE_URL, make_app
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# The replica bind points at the test database too, the statements are told
+# apart by the engine they run on
+
+VENUE = {
+    'name': 'Replicated Hall',
+    'city': 'Austin',
+    'state': 'TX',
+    'address': '1 Congress Ave',
+    'phone': '512-555-0100',
+    'genres': ['Jazz'],
+    'image_link': 'https://example.com/replicated.jpg',
+    'facebook_link': 'https://www.facebook.com/replicated',
+    'website': 'https://replicated.example.com',
+    'seeking_talent': 'False',
+    'seeking_description': '',
+}
+
+
+@pytest.fixture
+def replica_app(app):
+    return make_app(
+        SQLALCHEMY_BINDS={replicas.REPLICA_BIND: TEST_DATABASE_URL})
+
+
+@pytest.fixture
+def roles(replica_app):
+    # Engine role ('primary' or 'replica') of every statement run
+    with replica_app.app_context():
+        by_engine = {engine: role for role, engine in
+                     replicas.engines(replica_app).items()}
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(by_engine.get(conn.engine))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(Engine, 'before_cursor_execute', record)
+
+
+def routed(client, roles, method, url, **kwargs):
+    # Set of engine roles the request's statements ran on
+    del roles[:]
+    response = client.open(url, method=method, **kwargs)
+    assert response.status_code in (200, 302)
+    return set(roles)
+
+
+def test_reads_go_to_the_replica(replica_app, roles):
+    client = replica_app.test_client()
+    assert routed(client, roles, 'GET', '/venues?nocache=1') == {'replica'}
+    # Read-only POSTs too
+    assert routed(client, roles, 'POST', '/venues/search',
+                  data={'search_term': 'hall'}) == {'replica'}
+
+
+def test_reads_stick_to_the_primary_after_a_write(
+        replica_app, roles, monkeypatch):
+    client = replica_app.test_client()
+    assert routed(client, roles, 'POST', '/venues/create',
+                  data=VENUE) == {'primary'}
+    assert routed(client, roles, 'GET', '/venues?nocache=1') == {'primary'}
+
+    # Once REPLICA_STICKY_SECONDS are over
+    sticky = replica_app.config['REPLICA_STICKY_SECONDS']
+    now = replicas.time.time()
+    monkeypatch.setattr(replicas.time, 'time', lambda: now + sticky + 1)
+    assert routed(client, roles, 'GET', '/venues?nocache=1') == {'replica'}
+
+    # Other clients never stuck
+    assert routed(replica_app.test_client(), roles, 'GET',
+                  '/venues?nocache=1') == {'replica'}
+
+
+def test_reads_stick_to_the_primary_after_a_delete(replica_app, roles):
+    # Query.delete() commits without a flush
+    with replica_app.app_context():
+        venue = Venue(**dict(VENUE, name='Deleted Hall', seeking_talent=False))
+        db.session.add(venue)
+        db.session.commit()
+        venue_id = venue.id
+
+    client = replica_app.test_client()
+    assert routed(
+        client, roles, 'DELETE', f'/venues/{venue_id}') == {'primary'}
+    assert routed(client, roles, 'GET', '/venues?nocache=1') == {'primary'}
@@ -0,0 +1,52 @@
+import pytest
+
+from search import highlight, search
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+
+def test_highlight_marks_every_match():
+    assert str(highlight('Jazz and jazz', 'JAZZ')) == \
+        '<mark>Jazz</mark> and <mark>jazz</mark>'
+
+
+def test_highlight_escapes_the_rest():
+    assert str(highlight('<b>Rock</b> & Roll', 'roll')) == \
+        '&lt;b&gt;Rock&lt;/b&gt; &amp; <mark>Roll</mark>'
+    assert str(highlight('a.b', '.')) == 'a<mark>.</mark>b'
+    assert str(highlight('<i>', '')) == '&lt;i&gt;'
+    assert str(highlight(None, 'x')) == ''
+
+
+@pytest.fixture
+def venues(app):
+    # Two venues matching 'zyxw', whatever ran before
+    names = ('Zyxwv Hall', 'The Zyxwv Club')
+    with app.app_context():
+        Venue.query.filter(Venue.name.in_(names)).delete(
+            synchronize_session=False)
+        for name in names:
+            db.session.add(Venue(
+                name, ['Jazz'], 'Austin', 'TX', '1 Congress Ave', None,
+                None, None, None, False, None))
+        db.session.commit()
+    return names
+
+
+def test_search_finds_partial_names_and_counts_all_matches(app, venues):
+    with app.app_context():
+        result = search(Venue, ' zyxw ', limit=1)
+    assert result['count'] == 2
+    assert len(result['data']) == 1
+    match = result['data'][0]
+    assert match['name'] in venues
+    assert '<mark>Zyxw</mark>' in str(match['name_highlight'])
+
+
+def test_search_form(client, venues):
+    response = client.post('/venues/search', data={'search_term': 'zyxwv'})
+    assert response.status_code == 200
+    assert '<mark>Zyxwv</mark>' in response.get_data(as_text=True)
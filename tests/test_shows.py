@@ -0,0 +1,62 @@
+import pytest
+
+from app import shows_stamp
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Shows listing.
+#----------------------------------------------------------------------------#
+
+
+def test_unchanged_shows_page_is_a_cheap_304(client, statements):
+    etag = client.get('/shows').headers['ETag']
+
+    del statements[:]
+    response = client.get('/shows', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    # Only the stamp, no listing query
+    assert len(statements) == 1
+
+
+def test_shows_stamp_scans_no_table(app, statements):
+    with app.app_context():
+        shows_stamp()
+        statement, parameters = statements[-1]
+        cursor = db.session.connection().connection.cursor()
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        db.session.rollback()
+    assert 'Seq Scan on "Venue"' not in plan
+    assert 'Seq Scan on "Artist"' not in plan
+    assert 'Seq Scan on "Show' not in plan
+
+
+def test_shows_etag_changes_with_the_shows(app, client):
+    etag = client.get('/shows').headers['ETag']
+    with app.app_context():
+        show = Show.query.first()
+        db.session.delete(show)
+        db.session.commit()
+
+    response = client.get('/shows', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('url', [
+    '/shows?genre=Jazz',
+    '/shows?from=2026-01-01&to=2026-06-30&city=San%20Francisco&genre=Jazz',
+    '/shows/calendar?genre=Jazz',
+])
+def test_filtered_shows(client, url):
+    assert client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize('query', [
+    'from=2026-01-01T00:00:00%2B02:00',
+    'from=2026-01-01&to=2026-01-05T00:00:00Z',
+])
+def test_window_with_a_time_zone_is_rejected(client, query):
+    assert client.get('/shows?' + query).status_code == 400
+    assert client.get('/shows/calendar?' + query).status_code == 400
@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# Venues listing.
+#----------------------------------------------------------------------------#
+
+# The listing and the facet counts, however many venues and areas there are
+MAX_VENUES_STATEMENTS = 2
+
+
+def test_venues_statement_count(client, statements):
+    response = client.get('/venues?nocache=1')
+    assert response.status_code == 200
+    assert len(statements) <= MAX_VENUES_STATEMENTS
+
+
+def test_filtered_venues_statement_count(client, statements):
+    response = client.get('/venues?genre=Jazz&state=CA&nocache=1')
+    assert response.status_code == 200
+    assert len(statements) <= MAX_VENUES_STATEMENTS
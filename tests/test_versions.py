@@ -0,0 +1,46 @@
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Row versions.
+#----------------------------------------------------------------------------#
+
+
+def version_of(venue_id):
+    return db.session.query(Venue.version).filter(
+        Venue.id==venue_id).scalar()
+
+
+def update_venue(venue_id, **values):
+    # Core update, as the importer and the geohash backfill do
+    db.session.execute(Venue.__table__.update().where(
+        Venue.id==venue_id).values(**values))
+    db.session.commit()
+
+
+def test_updates_bump_the_version(app):
+    with app.app_context():
+        venue = Venue.query.first()
+        venue_id, version = venue.id, venue.version
+
+        venue.name += ' Updated'
+        db.session.commit()
+        assert version_of(venue_id) == version + 1
+
+        update_venue(venue_id, latitude=30.27, longitude=-97.74)
+        assert version_of(venue_id) == version + 2
+
+        # Counters and unchanged rows keep their version
+        update_venue(venue_id, upcoming_show_count=Venue.upcoming_show_count)
+        update_venue(venue_id, name=Venue.name)
+        assert version_of(venue_id) == version + 2
+
+
+def test_edits_of_a_changed_row_are_saved(app):
+    # version is no optimistic lock, the last write wins
+    with app.app_context():
+        venue = Venue.query.first()
+        update_venue(venue.id, phone='512-555-0199')
+
+        venue.phone = '512-555-0142'
+        db.session.commit()
+        assert Venue.query.get(venue.id).phone == '512-555-0142'
@@ -0,0 +1,10 @@
+from app import create_app, warmup
+
+#----------------------------------------------------------------------------#
+# WSGI entry point.
+#----------------------------------------------------------------------------#
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+
+app = create_app()
+warmup(app)